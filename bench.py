@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+
+'''
+bench: scaling benchmark of the sim engine. runs fixed-seed scenarios over order counts, shelf capacities and
+concurrency modes, and reports throughput and memory. saves them as JSON, and compares against a saved baseline
+'''
+
+import argparse
+import json
+from multiprocessing import get_context
+import resource
+import sys
+from time import time
+import tracemalloc
+
+import sim
+import sweep
+
+SHELF_CAPACITIES = {
+    'small': {'hot': 10,   'cold': 10,   'frozen': 10,   'overflow': 15},
+    'large': {'hot': 1000, 'cold': 1000, 'frozen': 1000, 'overflow': 1500}}
+
+MODES = {'P': 'priority', 'D': 'des', 'T': 'temporal', 'A': 'async'}
+
+PERF_CONFIG = { # the perf mode. so it's the engine being measured, not the logging, nor the retained outcomes
+    'log_level'          : 'WARNING',
+    'log_shelves'        : False,
+    'status_every_events': 0,
+    'retention'          : 'counters'}
+
+
+def scenarios(exponents, capacities, modes):
+    return [{'name': '%s-%i-%s' % (mode, 10**e, cap), 'mode': mode, 'orders': 10**e, 'capacity': cap}
+            for e in exponents for cap in capacities for mode in modes]
+
+def run_scenario(scenario, seed, order_rate):
+    # one scenario, in its own fresh process, so its peak RSS is its own
+    sim.configure(concurrency=MODES[scenario['mode']], shelf_capacity=SHELF_CAPACITIES[scenario['capacity']],
+                  order_rate=order_rate, seed=seed, orders_source='synthetic', synthetic_count=scenario['orders'],
+                  **PERF_CONFIG)
+    rss_before = peak_rss()
+    started = time()
+    sim.run()
+    real_span = time() - started
+    rss_peak = peak_rss()
+    events = sim.kt.counts['events']
+    return dict(scenario,
+        events         = events,
+        real_span      = real_span,
+        simu_span      = sim.simu_time_span,
+        events_per_sec = events / real_span,
+        us_per_event   = real_span / events * 1e6, # wall clock per handled event, order placement included
+        peak_rss       = rss_peak,
+        bytes_per_order= (rss_peak - rss_before) / scenario['orders'],
+        delivered      = sim.kt.counts['orders_delivered'])
+
+def record_bytes(count=100000, seed=1):
+    # the bytes the kitchen holds per order it has received, but whose courier hasn't come yet: its OrderRecord,
+    # and its entry in kt.records. by tracemalloc, so exact, unlike the RSS. the orders themselves are let go
+    sim.configure(seed=seed, orders_source='synthetic', courier_dispatch_enabled=False, **PERF_CONFIG)
+    kt = sim.KitchenThread(0.0)
+    orders = sim.synthetic_orders(count, seed)
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        for pos, order in enumerate(orders, 1):
+            kt.receive_order(pos, order, 0.0)
+        return (tracemalloc.get_traced_memory()[0] - before) / count
+    finally:
+        tracemalloc.stop()
+
+def peak_rss():
+    # in bytes. ru_maxrss is KiB on Linux but bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+def bench(exponents=(3, 4, 5), capacities=('small', 'large'), modes=('P', 'D'), seed=1, order_rate=2.0):
+    # one scenario at a time, so they don't compete for the CPU, each in a new process, never reused
+    results = []
+    ctx = get_context('spawn') # a clean interpreter, so no RSS carried over from this one
+    for scenario in scenarios(exponents, capacities, modes):
+        with ctx.Pool(1, sweep.init_worker, (PERF_CONFIG['log_level'],), maxtasksperchild=1) as pool:
+            result = pool.apply(run_scenario, (scenario, seed, order_rate))
+        print_result(result)
+        results.append(result)
+    return results
+
+def compare(results, baseline, tolerance):
+    # the scenarios whose events/sec fell more than tolerance (a fraction) below the baseline's
+    base = {r['name']: r for r in baseline['results']}
+    regressions = []
+    for r in results:
+        b = base.get(r['name'])
+        if b and r['events_per_sec'] < b['events_per_sec'] * (1 - tolerance):
+            regressions.append((r['name'], b['events_per_sec'], r['events_per_sec']))
+    return regressions
+
+def print_result(r, f=sys.stdout):
+    f.write('%-22s events %9i  %10.0f events/s  %8.2f us/event  peak rss %7.1f MiB  %8.1f bytes/order\n' % (
+        r['name'], r['events'], r['events_per_sec'], r['us_per_event'], r['peak_rss'] / 2**20, r['bytes_per_order']))
+    f.flush()
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='benchmarks the sim engine over order counts, shelf capacities and modes')
+    ap.add_argument('--sizes', default='3,4,5', help='order counts, as powers of 10. eg. 3,4,5,6,7 for 10^3 to 10^7')
+    ap.add_argument('--capacities', default='small,large', help='of %s' % ','.join(SHELF_CAPACITIES))
+    ap.add_argument('--modes', default='P,D', help='concurrency modes, of %s. the real time ones take real time' % ','.join(MODES))
+    ap.add_argument('--seed', type=int, default=1)
+    ap.add_argument('--order-rate', type=float, default=2.0)
+    ap.add_argument('--out', help='JSON file to save the results to')
+    ap.add_argument('--baseline', help='JSON file of earlier results to compare against')
+    ap.add_argument('--tolerance', type=float, default=0.10, help='fraction events/sec may fall below baseline. default 0.10')
+    args = ap.parse_args(argv)
+
+    exponents  = [int(e) for e in args.sizes.split(',')]
+    capacities = args.capacities.split(',')
+    modes      = args.modes.split(',')
+    for c in capacities:
+        if c not in SHELF_CAPACITIES: ap.error('unknown capacity: %s' % c)
+    for m in modes:
+        if m not in MODES: ap.error('unknown mode: %s' % m)
+
+    results = bench(exponents, capacities, modes, args.seed, args.order_rate)
+    held = record_bytes(seed=args.seed)
+    print('%-22s %8.1f bytes/order held' % ('records', held))
+    report = {'python': sys.version.split()[0], 'numpy': sim.np is not None, 'seed': args.seed,
+              'order_rate': args.order_rate, 'record_bytes': held, 'results': results}
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=1)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for name, before, after in regressions:
+            print('REGRESSION %-22s %10.0f -> %10.0f events/s (%+.1f%%)' % (name, before, after, (after / before - 1) * 100))
+        if regressions:
+            return 1
+        print('no regressions beyond %g%% of baseline' % (args.tolerance * 100))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,15 +1,51 @@
 {
-'concurrency'                    : 'priority',    # temporal or priority
+'concurrency'                    : 'priority',    # temporal, priority, des or async
 'order_rate'                     : 2.0,           # float, new orders submitted per second. may be 0 or float('inf')
+'arrival_process'                : 'constant',    # order gaps: constant (1/order_rate), poisson (at order_rate) or profile
+'arrival_profile'                : None,          # for profile: [(sim secs since start, orders per sec), ...], sorted, from 0
+'arrival_profile_period'         : None,          # float, secs after which the profile repeats, eg. 86400 for time of day
 'courier_arrival_min'            : 2.0,           # float, min seconds before courier arrives, in random range
 'courier_arrival_max'            : 6.0,           # float, max, ditto above
+'seed'                           : None,          # int, seeds courier delays & order gaps so a run can be reproduced. None is unseeded
+'time_scale'                     : 1.0,           # float, temporal & async only. sim seconds per real second, eg. 60 runs 1h in 1m
 'shelf_capacity'                 : {              # int, every capacity may be 0 or float('inf')
     'hot'                        : 10,
     'cold'                       : 10,
     'frozen'                     : 10,
     'overflow'                   : 15},
-'orders_file'                    : 'orders.json', # file to read orders from
-'orders_literal'                 : None,          # can be literal [] of orders; if defined they supersede the orders_file
+'overflow_eviction'              : 'fifo',        # order dropped from a full overflow: fifo, least_value or soonest_expiry
+'orders_file'                    : 'orders.json', # file to stream orders from. JSON array, or NDJSON (1 order per line)
+'orders_count_pass'              : True,          # if orders_file has no total header, count it up front (for the log only)
+'orders_literal'                 : None,          # can be literal [] of orders; if defined they supersede the orders_file/source
+'orders_source'                  : 'file',        # file (orders_file) or synthetic (generated as placed, per the synthetic_* params)
+'synthetic_count'                : 1000,          # int, synthetic orders to place. None for unbounded (not in priority mode)
+'synthetic_temp_mix'             : {              # relative weights of the synthetic orders' temps
+    'hot'                        : 1,
+    'cold'                       : 1,
+    'frozen'                     : 1},
+'synthetic_shelf_life'           : (20, 600),     # int range, inclusive, of synthetic shelfLife, drawn uniformly
+'synthetic_decay_rate'           : (0.05, 0.9),   # float range of synthetic decayRate, drawn uniformly
 'courier_dispatch_enabled'       : True,          # toggled off for testing only
-'log_config_large_orders_literal': True           # if run with a huge orders_literal (like for a test) might want to turn this off
+'kitchens'                       : 1,             # int, kitchens in the fleet sharing the orders. see fleet.py
+'kitchen'                        : 0,             # int, this run's kitchen, 0 to kitchens-1. it only gets orders of that kitchen field, or id hash
+'kitchen_share'                  : None,          # float, this kitchen's fraction of the fleet's orders, and so of order_rate. None is 1/kitchens
+'orders_rows'                    : None,          # the rows of a columnar orders_file to place, in order, instead of all. fleet.py splits them
+'trace_file'                     : None,          # records every event KT handles to this binary file. ./sim.py --replay it
+'checkpoint_file'                : None,          # des only. saves the run's full state here, periodically. ./sim.py --resume it
+'checkpoint_every_events'        : 0,             # int, checkpoint once this many events were handled since the last. 0 off
+'checkpoint_every_simtime'       : 0,             # float, also checkpoint once this many sim seconds passed since the last. 0 off
+'retention'                      : 'full',        # finished orders kept in memory: full (all, for tests), ring (latest N) or counters
+'retention_ring_size'            : 1000,          # int, N for the ring retention, per outcome (capdropped, wasted, delivered)
+'log_config_large_orders_literal': True,          # if run with a huge orders_literal (like for a test) might want to turn this off
+'log_level'                      : None,          # eg. 'WARNING' to skip nearly all logging, for perf. None leaves it as is (INFO)
+'status_every_events'            : 1,             # int, KT logs STATUS every N events handled. 0 for never (MT still logs first & last)
+'status_every_simtime'           : 0,             # float, KT also logs STATUS when this many sim seconds passed since the last. 0 off
+'log_file'                       : None,          # log to this file, not stdout, via a queue and a writer thread, in batches. gzipped if .gz
+'log_queue_size'                 : 100000,        # int, log lines queued for log_file's writer. under overload any more are dropped, counted
+'log_shelves'                    : True,          # dump every shelved order's value with each STATUS and waste check. off for perf
+'metrics_file'                   : None,          # KT's metrics (see Metrics) sampled by sim time into this time-series file
+'metrics_format'                 : 'csv',         # csv or ndjson
+'metrics_every_simtime'          : 1.0,           # float, sim seconds between the samples
+'latency_stats'                  : False,         # time each event's handling and its wait in KT's queue, by type. MT logs p50/p99/max at the end
+'shelf_arrays'                   : False          # value & waste-check whole shelves at once, via numpy arrays if installed
 }
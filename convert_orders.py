@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+
+'''
+convert_orders: converts an orders file (a JSON array, or NDJSON) to the columnar binary format, which the sim memory
+maps rather than parses. use the result as the orders_file like any other
+'''
+
+import argparse
+import sys
+
+import sim
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='converts a JSON/NDJSON orders file to the columnar binary orders format')
+    ap.add_argument('input', help='orders file, JSON array or NDJSON')
+    ap.add_argument('output', help='columnar orders file to write')
+    args = ap.parse_args(argv)
+    try:
+        count = sim.write_columnar_orders(sim.iter_orders(args.input), args.output)
+    except ValueError as ex:
+        ap.error(str(ex))
+    print('%i orders written to %s' % (count, args.output))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+
+'''
+fleet: a multi-kitchen sim. shards one stream of orders across many kitchens, each its own sim run in a worker process
+of a pool, then merges their counters and peaks into one fleet summary
+'''
+
+import argparse
+from array import array
+import json
+from multiprocessing import Pool
+import os
+import struct
+import sys
+from tempfile import TemporaryDirectory
+
+import sim
+import sweep
+
+COLUMNS = ('kitchen', 'orders', 'delivered', 'wasted', 'capdrops', 'noshelf',
+           'peak_hot', 'peak_cold', 'peak_frozen', 'peak_overflow', 'simu_span', 'real_span', 'error')
+
+SUMMED = ('orders', 'delivered', 'wasted', 'capdrops', 'noshelf')
+
+
+def run_kitchen(job):
+    # one kitchen's sim run, in a pool worker, of just its own orders, as split for it. returns its summary row, with
+    # its full counts and peaks, or the error which stopped it
+    path, overrides, kitchen = job
+    row = {'kitchen': kitchen}
+    try:
+        sim.configure(*(path and (path,) or ()), kitchen=kitchen, **overrides)
+        sim.run()
+        row.update(sim.summary())
+        row['counts'] = sim.kt.all_counts()
+        row['peaks']  = dict(sim.kt.peaks)
+    except Exception as ex:
+        row['error'] = repr(ex)
+    return row
+
+def merge(rows):
+    # the fleet's summary row: outcome counts and every counter summed, peaks and spans the max of any kitchen's
+    fleet = {'kitchen': 'fleet', 'counts': {}, 'peaks': {}}
+    ok = [r for r in rows if not r.get('error')]
+    for r in ok:
+        for k, v in r['counts'].items():
+            fleet['counts'][k] = fleet['counts'].get(k, 0) + v
+        for k, v in r['peaks'].items():
+            fleet['peaks'][k] = max(fleet['peaks'].get(k, 0), v)
+    for c in SUMMED:
+        fleet[c] = sum(r[c] for r in ok)
+    for c in COLUMNS:
+        if c.startswith('peak_') or c.endswith('_span'):
+            fleet[c] = max((r[c] for r in ok), default=None)
+    errors = sum(1 for r in rows if r.get('error'))
+    if errors:
+        fleet['error'] = '%i of %i kitchens failed' % (errors, len(rows))
+    return fleet
+
+def fleet(path=None, overrides=None, kitchens=2, workers=None, log_level='WARNING'):
+    # returns the kitchens' summary rows, in kitchen order, and the fleet's merged one
+    overrides = dict(overrides or {}, kitchens=kitchens, log_level=log_level)
+    sweep.init_worker(log_level)
+    sim.configure(*(path and (path,) or ()), **overrides) # just to see the config the kitchens will run
+    with TemporaryDirectory() as tmp:
+        jobs = [(path, dict(overrides, **own), k) for k, own in enumerate(split(sim.cfg, kitchens, tmp))]
+        with Pool(workers, initializer=sweep.init_worker, initargs=(log_level,)) as pool:
+            rows = pool.map(run_kitchen, jobs, chunksize=1)
+    return rows, merge(rows)
+
+def split(cfg, kitchens, tmp):
+    # splits the orders between the kitchens, once, here, so each kitchen's run touches only its own. returns each
+    # kitchen's config overrides: its orders, and its share of them all (and so of the order_rate). a synthetic source
+    # needs none, as each kitchen draws its own share. an orders file is made columnar, in tmp, if it isn't yet, and
+    # each kitchen is given its rows of it. unless its orders don't fit that format, when it's read whole, like a literal
+    if kitchens == 1 or cfg['orders_literal'] is None and cfg['orders_source'] != 'file':
+        return [{}] * kitchens
+    if cfg['orders_literal'] is None:
+        orders_file = cfg['orders_file']
+        if not sim.is_columnar_orders(orders_file):
+            try:
+                sim.write_columnar_orders(sim.iter_orders(orders_file), os.path.join(tmp, 'orders.kso'))
+                orders_file = os.path.join(tmp, 'orders.kso')
+            except (ValueError, struct.error):
+                orders_file = None
+        if orders_file is not None:
+            rows = [array('I') for k in range(kitchens)]
+            with sim.ColumnarOrders(orders_file) as orders:
+                for i, k in enumerate(orders.row_kitchens(kitchens)):
+                    rows[k].append(i)
+            total = sum(len(r) for r in rows) or 1
+            return [{'orders_file': orders_file, 'orders_rows': r, 'kitchen_share': len(r) / total} for r in rows]
+    literals = [[] for k in range(kitchens)]
+    for order in cfg['orders_literal'] if cfg['orders_literal'] is not None else sim.iter_orders(cfg['orders_file']):
+        literals[sim.order_kitchen(order, kitchens)].append(order)
+    total = sum(len(l) for l in literals) or 1
+    return [{'orders_literal': l, 'kitchen_share': len(l) / total} for l in literals]
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='shards the orders across many kitchens, run in parallel, and merges their summaries')
+    ap.add_argument('config', nargs='?', help='config file. none for just config.py')
+    ap.add_argument('-k', '--kitchens', type=int, default=2)
+    ap.add_argument('--set', help="dict literal of config overrides, eg. \"{'orders_source': 'synthetic'}\"")
+    ap.add_argument('--workers', type=int, help='processes in the pool. default one per core')
+    ap.add_argument('--log-level', default='WARNING', help='of each kitchen. default WARNING')
+    ap.add_argument('--format', choices=('table', 'csv', 'json'), default='table')
+    args = ap.parse_args(argv)
+    if args.kitchens < 1:
+        ap.error('--kitchens must be at least 1')
+
+    overrides = eval(args.set) if args.set else None # same as the config files, a Python literal
+    rows, merged = fleet(args.config, overrides, args.kitchens, args.workers, args.log_level)
+
+    if args.format == 'json':
+        json.dump({'kitchens': rows, 'fleet': merged}, sys.stdout, indent=1, default=str)
+        sys.stdout.write('\n')
+    elif args.format == 'csv':
+        sweep.print_csv(rows + [merged], columns=COLUMNS)
+    else:
+        sweep.print_table(rows + [merged], columns=COLUMNS)
+    return 1 if merged.get('error') else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -17,6 +17,22 @@ P-140-200-200-10-10-10-15-orders
 P-140-200-200-inf-inf-inf-0-orders
 P-140-4200-4200-10-10-10-15-orders
 P-200-60-70-10-10-10-15-orders
+D-0-2-6-10-10-10-15-orders
+D-2-0-0-10-10-10-15-orders
+D-2-2-2-10-10-10-15-orders
+D-2-2-6-0-0-0-0-orders
+D-2-2-6-1-1-0-0-orders
+D-2-2-6-10-10-10-15-orders
+D-2-2-6-inf-inf-inf-0-orders
+D-inf-2-6-10-10-10-15-orders
+D-0.5-3-3-10-10-10-15-orders
+D-0.5-300-300-10-10-10-15-orders
+D-140-2-2-10-10-10-15-orders
+D-140-120-120-10-10-10-15-orders
+D-140-200-200-10-10-10-15-orders
+D-140-200-200-inf-inf-inf-0-orders
+D-140-4200-4200-10-10-10-15-orders
+D-200-60-70-10-10-10-15-orders
 T-0-2-6-10-10-10-15-orders
 T-2-0-0-10-10-10-15-orders
 T-2-2-2-10-10-10-15-orders
@@ -31,9 +47,24 @@ T-140-2-2-10-10-10-15-orders
 T-140-120-120-10-10-10-15-orders
 T-140-200-200-10-10-10-15-orders
 T-140-200-200-inf-inf-inf-0-orders
-T-200-60-70-10-10-10-15-orders)
+T-200-60-70-10-10-10-15-orders
+A-0-2-6-10-10-10-15-orders
+A-2-0-0-10-10-10-15-orders
+A-2-2-2-10-10-10-15-orders
+A-2-2-6-0-0-0-0-orders
+A-2-2-6-1-1-0-0-orders
+A-2-2-6-10-10-10-15-orders
+A-2-2-6-inf-inf-inf-0-orders
+A-inf-2-6-10-10-10-15-orders
+A-0.5-3-3-10-10-10-15-orders
+A-0.5-300-300-10-10-10-15-orders
+A-140-2-2-10-10-10-15-orders
+A-140-120-120-10-10-10-15-orders
+A-140-200-200-10-10-10-15-orders
+A-140-200-200-inf-inf-inf-0-orders
+A-200-60-70-10-10-10-15-orders)
 
-# NOTE there is no T/4200-4200 case above because it would take 70 mins. the other perms give enough evidence
+# NOTE there is no T/4200-4200 (nor A/4200-4200) case above because it would take 70 mins. the other perms give enough evidence
 
 mkdir -p logs
 
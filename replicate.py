@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+
+'''
+replicate: Monte Carlo replication of one sim config. runs it over and over, each run with its own recorded seed,
+across a process pool, then reports the mean, stdev and confidence interval of every count and shelf peak
+'''
+
+import argparse
+import json
+from math import atan, cos, pi, sin, sqrt
+from multiprocessing import Pool
+import os
+from random import Random, SystemRandom
+from statistics import NormalDist, mean, stdev
+import sys
+
+import sim
+import sweep
+
+
+def replicate_seeds(master_seed):
+    # the seed of each replicate in turn. all derived from the one master seed, so the whole set can be re-run
+    r = Random(master_seed)
+    while True:
+        yield r.getrandbits(63)
+
+def run_replicate(job):
+    # one sim run, in a pool worker. returns its metrics: every count, every shelf peak and the sim time span
+    path, overrides, seed = job
+    sim.configure(*(path and (path,) or ()), seed=seed, **overrides)
+    sweep.use_cached_orders()
+    sim.run()
+    metrics = sim.kt.all_counts()
+    for sn, peak in sim.kt.peaks.items():
+        metrics['peak_' + sn] = peak
+    metrics['simu_span'] = sim.simu_time_span
+    return metrics
+
+def t_cdf(t, df):
+    # Student's t CDF, exact, for a whole df, by the finite series in the angle atan(t/sqrt(df))
+    theta = atan(t / sqrt(df))
+    c2, term, series = cos(theta)**2, 1.0, 1.0
+    for k in range(2, df - 1 - df % 2, 2): # k = 2, 4 .. df-2 if df is even, .. df-3 if odd
+        term *= c2 * k / (k + 1) if df % 2 else c2 * (k - 1) / k
+        series += term
+    if df % 2 == 0:
+        a = sin(theta) * series
+    else:
+        a = 2 / pi * (theta + (sin(theta) * cos(theta) * series if df > 1 else 0))
+    return (1 + a) / 2
+
+def t_quantile(p, df):
+    # Student's t quantile. for df <= 5, the few replicates an early stop may start from, by bisecting the exact
+    # CDF. above that, by the Cornish-Fisher expansion around the normal quantile, within ~0.1%, which is plenty for
+    # a CI. avoids needing scipy
+    z = NormalDist().inv_cdf(p)
+    if df is None or df == float('inf'): return z
+    if df <= 5:
+        lo, hi = -1.0, 1.0
+        while t_cdf(lo, df) > p: lo *= 2
+        while t_cdf(hi, df) < p: hi *= 2
+        for i in range(100):
+            mid = (lo + hi) / 2
+            if t_cdf(mid, df) < p: lo = mid
+            else: hi = mid
+        return (lo + hi) / 2
+    return (z
+        + (z**3 + z) / (4 * df)
+        + (5*z**5 + 16*z**3 + 3*z) / (96 * df**2)
+        + (3*z**7 + 19*z**5 + 17*z**3 - 15*z) / (384 * df**3)
+        + (79*z**9 + 776*z**7 + 1482*z**5 - 1920*z**3 - 945*z) / (92160 * df**4))
+
+def stats(values, confidence):
+    # mean, stdev and the confidence interval of the mean, as a dict
+    n = len(values)
+    m = mean(values)
+    sd = stdev(values) if n > 1 else 0.0
+    half = t_quantile(0.5 + confidence / 2, n - 1) * sd / sqrt(n) if n > 1 else float('inf')
+    return {'n': n, 'mean': m, 'stdev': sd, 'ci_low': m - half, 'ci_high': m + half, 'ci_width': 2 * half}
+
+def replicate(path=None, overrides=None, max_reps=30, min_reps=5, master_seed=None, metric=None, ci_width=None,
+              confidence=0.95, workers=None, log_level='WARNING'):
+    # runs replicates in rounds, one per worker, til max_reps, or til the metric's CI is no wider than ci_width
+    # (checked after each replicate, in seed order, so where it stops doesn't depend on the worker count).
+    # returns a dict of the seeds used, whether it stopped early, and the stats of every metric
+    if master_seed is None:
+        master_seed = SystemRandom().getrandbits(63)
+    overrides = dict(overrides or {}, log_level=log_level)
+    seeds = replicate_seeds(master_seed)
+    round_size = workers or os.cpu_count() or 1
+    used, results, stopped_early = [], [], False
+    with Pool(workers, initializer=sweep.init_worker, initargs=(log_level,)) as pool:
+        while len(results) < max_reps and not stopped_early:
+            round_seeds = [next(seeds) for i in range(min(round_size, max_reps - len(results)))]
+            for seed, metrics in zip(round_seeds, pool.map(run_replicate, [(path, overrides, s) for s in round_seeds], chunksize=1)):
+                if metric and metric not in metrics:
+                    raise KeyError('unknown metric: %s' % metric)
+                used.append(seed)
+                results.append(metrics)
+                if metric and ci_width is not None and len(results) >= max(min_reps, 2) \
+                        and stats([r[metric] for r in results], confidence)['ci_width'] <= ci_width:
+                    stopped_early = len(results) < max_reps
+                    break
+    return {
+        'config'       : path or '-',
+        'overrides'    : overrides,
+        'master_seed'  : master_seed,
+        'seeds'        : used,
+        'stopped_early': stopped_early,
+        'confidence'   : confidence,
+        'stats'        : {k: stats([r[k] for r in results], confidence) for k in results[0]}}
+
+def print_report(report, f=sys.stdout):
+    f.write('config %s, replicates %i, master seed %i, confidence %g%s\n' % (report['config'], len(report['seeds']),
+        report['master_seed'], report['confidence'], report['stopped_early'] and ', stopped early' or ''))
+    f.write('%-26s %12s %12s %12s %12s %12s\n' % ('metric', 'mean', 'stdev', 'ci_low', 'ci_high', 'ci_width'))
+    for k, s in report['stats'].items():
+        f.write('%-26s %12.4f %12.4f %12.4f %12.4f %12.4f\n' % (k, s['mean'], s['stdev'], s['ci_low'], s['ci_high'], s['ci_width']))
+    f.write('seeds: %s\n' % ' '.join(str(s) for s in report['seeds']))
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='runs one sim config many times, with recorded seeds, and reports CIs of its outcomes')
+    ap.add_argument('config', nargs='?', help='config file. none for just config.py')
+    ap.add_argument('--set', help="dict literal of config overrides, eg. \"{'order_rate': 10}\"")
+    ap.add_argument('-n', '--max-reps', type=int, default=30)
+    ap.add_argument('--min-reps', type=int, default=5, help='before an early stop is considered')
+    ap.add_argument('--seed', type=int, help='master seed, which all the replicate seeds derive from. default random')
+    ap.add_argument('--metric', help='count or peak to watch for an early stop, eg. orders_delivered or peak_overflow')
+    ap.add_argument('--ci-width', type=float, help="stop once the metric's CI (high - low) is no wider than this")
+    ap.add_argument('--confidence', type=float, default=0.95)
+    ap.add_argument('--workers', type=int, help='processes in the pool. default one per core')
+    ap.add_argument('--log-level', default='WARNING', help='of each run. default WARNING')
+    ap.add_argument('--format', choices=('table', 'json'), default='table')
+    args = ap.parse_args(argv)
+    if (args.metric is None) != (args.ci_width is None):
+        ap.error('--metric and --ci-width go together')
+
+    overrides = eval(args.set) if args.set else None # same as the config files, a Python literal
+    try:
+        report = replicate(args.config, overrides, args.max_reps, args.min_reps, args.seed, args.metric, args.ci_width,
+                           args.confidence, args.workers, args.log_level)
+    except KeyError as ex:
+        ap.error(ex.args[0])
+
+    if args.format == 'json':
+        json.dump(report, sys.stdout, indent=1, default=str)
+        sys.stdout.write('\n')
+    else:
+        print_report(report)
+
+if __name__ == '__main__':
+    main()
@@ -5,24 +5,843 @@ ksim: a restaurant delivery sim (as a low-fidelity, proof-of-concept spike)
 by Mike Kramlich, groglogic@gmail.com, 2020 May 19
 '''
 
-from json      import load as json_load
+import asyncio
+from bisect    import bisect_right
+from heapq     import heapify, heappop, heappush
+from collections import defaultdict, deque
+import gzip
+from itertools import accumulate, islice
+from math      import ceil, frexp, ldexp
+from json      import JSONDecoder, JSONDecodeError, dumps as json_dumps, loads as json_loads
 import logging
-from logging   import DEBUG, INFO, ERROR
-from random    import uniform
+from logging   import DEBUG, INFO, WARNING, ERROR
+import mmap
+import os
+import pickle
+from random    import Random
 from queue     import PriorityQueue, Queue
+from struct    import Struct
+from tempfile  import TemporaryFile
 import sys
-from threading import current_thread, Thread, Timer
-from time      import sleep, time
+from threading import Condition, Event, current_thread, Thread
+from time      import monotonic, perf_counter, sleep, time
+from uuid      import UUID
+from zlib      import crc32
+
+try:
+    import numpy as np
+except ImportError: # optional. without it, shelf_arrays values each order in a pure Python loop instead
+    np = None
 
 SINGLE_TEMPS   = ('hot', 'cold', 'frozen')
 
+# order location codes. the single temp shelves come first, so a temp's code is also its shelf's code
+HOT, COLD, FROZEN, OVERFLOW, CAPDROP, WASTED, DELIVERED, NOSHELF = range(8)
+LOC_NAMES      = ('hot', 'cold', 'frozen', 'overflow', 'capdrop', 'wasted', 'delivered', 'noshelf')
+LOC_CODES      = {name: code for code, name in enumerate(LOC_NAMES)}
+TEMP_CODES     = {name: LOC_CODES[name] for name in SINGLE_TEMPS}
+ORDER_FIELDS   = ('id', 'name', 'temp', 'shelfLife', 'decayRate') # of an order, as given. see OrderRecord
+SHELF_CODES    = (HOT, COLD, FROZEN, OVERFLOW)
+SHELF_DECAY_MODIFIERS = (1.0, 1.0, 1.0, 2.0, 2.0, 2.0, 2.0, 2.0) # by loc code. ideal temp shelf is normal, anywhere else 2x
+
+EV_SHUTDOWN        = 0 # event type codes. an event is a flat record: (priority, code, a, b), plus its enqueue stamp
+EV_COURIER_ARRIVED = 1 # if cfg.latency_stats. a and b are: nothing for shutdown, (courier timer, OrderRecord) for
+EV_ORDER_RECEIVED  = 2 # courier_arrived, and (pos, order) for order_received. ties on priority rank by code, low first
+EVENT_NAMES        = ('shutdown', 'courier_arrived', 'order_received') # by code
+
 SHUTDOWN_P     = float('inf') # makes shutdown event lowest priority so all other events processed first
 TEMPORAL_P     = -1           # priority field ignored in temporal mode. prefer consistency
 
+ORDERS_CHUNK_SIZE = 1 << 16   # chars read per gulp when streaming an orders file
+EXPIRY_SLACK      = 1e-12     # relative. deadlines this close to now are checked exactly, in case of float rounding
+VARIATES_CHUNK    = 1 << 12   # random variates drawn per vectorized call
+SYNTHETIC_SALT    = 0x9e3779b97f4a7c15 # xored into the synthetic orders' seed for their variates, apart from their ids'
+SHELF_ARRAYS_MIN  = 64        # slots a shelf's arrays start with. they double when full, since capacity may be inf
+
+CHECKPOINT_VERSION  = 6       # of the checkpoint file's state dict. bumped whenever what's saved changes
+CHECKPOINT_OT_ATTRS = ('started', 'now', 'placed', 'arrivals')
+CHECKPOINT_KT_ATTRS = ('started', 'now', 'should_run', 'status_at', 'q', 'shelves', 'shelf_list', 'peaks', 'records',
+                       'capacity_dropped', 'wasted', 'delivered', 'courier_timers', 'variates', 'expiries', 'expiry_seq', 'counts',
+                       'event_counts', 'series', 'trace')
+
+TRACE_MAGIC         = b'KSIMTRC1' # starts a trace file. then its header, then one fixed-width record per event
+TRACE_HEADER        = Struct('<d')    # the kitchen's start time
+TRACE_RECORD        = Struct('<BdQd') # event code, sim time, order pos, courier delay (of order_received, else 0)
+TRACE_CHUNK_RECORDS = 1 << 12         # records read per gulp when replaying
+
+COLUMNAR_MAGIC   = b'KSIMCOL1'  # starts a columnar orders file. see ColumnarOrders
+COLUMNAR_HEADER  = Struct('<QQQ') # order count, then the string table's offset and size in bytes
+COLUMNAR_COLUMNS = {              # in file order, each one value per order. widest first, so every column is aligned
+    'id'         : Struct('<16s'), # UUID, as its 16 raw bytes
+    'shelfLife'  : Struct('<d'),
+    'decayRate'  : Struct('<d'),
+    'name'       : Struct('<I'),   # index into the string table
+    'temp'       : Struct('<I'),   # ditto
+    'kitchen'    : Struct('<i')}   # -1 if the order had none
+
+LOG_FORMAT        = '%(levelname)-5s %(threadName)s: %(message)s'
+LOG_BATCH_RECORDS = 1 << 12 # queued records which wake the log sink's writer early, rather than at its next flush
+LOG_FLUSH_SECS    = 0.05    # the most the log sink's writer waits between batches
+
+LATENCY_MIN_EXP = -29 # LogHistogram's buckets span 2^-30 (~1ns) to 2^8 secs
+LATENCY_MAX_EXP = 8
+LATENCY_SUB     = 8   # buckets per power of 2, so a quantile is within 1/8 of the truth
+LATENCY_BUCKETS = (LATENCY_MAX_EXP - LATENCY_MIN_EXP + 1) * LATENCY_SUB
+
+SYNTHETIC_NAMES = { # by temp, for the synthetic orders
+    'hot'   : ('Cheese Pizza', 'Pad See Ew', 'Beef Stew', 'Ramen', 'Burger', 'Tacos', 'Pho', 'Mac & Cheese'),
+    'cold'  : ('Cobb Salad', 'Poke Bowl', 'Coleslaw', 'Sushi', 'Gazpacho', 'Yogurt', 'Cottage Cheese', 'Spring Rolls'),
+    'frozen': ('Banana Split', 'Popsicle', 'Mint Ice Cream', 'Sorbet', 'Frozen Pizza', 'Mochi', 'Gelato', 'Ice Pop')}
+
+log_sink       = None         # the BatchingLogHandler of the last run with a log_file. top-level for testing only
 cfg            = None         # config dict. loads config.py first/always, then updates by sys argv config file. tests can override last
 ot             = None         # top-level for testing only
 kt             = None         # top-level for testing only
 simu_time_span = None         # top-level for testing only
+real_time_span = None         # ditto. also for summary()
+
+
+class EventHeap:
+    # stand-in for PriorityQueue in des mode, where only MT ever touches it, so no locks are needed.
+    # ties on priority rank by event code, as PriorityQueue's do, so equal-time events are handled in the same order in
+    # both modes. then by insertion sequence, so equal-time events of one type come out in the order they went in
+    def __init__(self):
+        self.heap = []
+        self.seq  = 0
+
+    def put(self, event):
+        heappush(self.heap, (event[0], event[1], self.seq, event))
+        self.seq += 1
+
+    def get(self):
+        return heappop(self.heap)[3]
+
+    def peek(self):
+        return self.heap[0][3]
+
+    def qsize(self):
+        return len(self.heap)
+
+    def task_done(self):
+        pass
+
+
+class LogHistogram:
+    # fixed memory histogram of durations, in secs, with log spaced buckets. however many are added it stays the same
+    # size, and any quantile of them is within ~1/LATENCY_SUB of the truth. durations outside its span go in the end buckets
+    __slots__ = ('counts', 'n', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * LATENCY_BUCKETS
+        self.n      = 0
+        self.total  = 0.0
+        self.max    = 0.0
+
+    def add(self, secs):
+        m, e = frexp(secs) # secs = m * 2**e, 0.5 <= m < 1
+        i = (e - LATENCY_MIN_EXP) * LATENCY_SUB + int((m - 0.5) * 2 * LATENCY_SUB)
+        self.counts[0 if i < 0 or secs <= 0 else i if i < LATENCY_BUCKETS else LATENCY_BUCKETS - 1] += 1
+        self.n     += 1
+        self.total += secs
+        if secs > self.max: self.max = secs
+
+    def quantile(self, q):
+        # the upper bound of the bucket with the q-th duration in it, but never more than the max. 0 if none added
+        rank = max(1, ceil(q * self.n))
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                if i == LATENCY_BUCKETS - 1: return self.max # the end bucket has no upper bound
+                return min(ldexp(0.5 + (i % LATENCY_SUB + 1) / (2 * LATENCY_SUB), i // LATENCY_SUB + LATENCY_MIN_EXP), self.max)
+        return 0.0
+
+
+class BatchingLogHandler(logging.Handler):
+    # an opt-in log sink, so no logging thread ever blocks on I/O. emit only queues the record, with its message merged
+    # in (its args may be mutable, like an OrderRecord, so can't wait). a background thread formats the queued records
+    # and writes them to the file in batches, gzipped if it ends .gz. a full queue drops records rather than block, counted
+    def __init__(self, path, capacity):
+        logging.Handler.__init__(self)
+        self.setFormatter(logging.Formatter(LOG_FORMAT))
+        self.path     = path
+        self.capacity = capacity
+        self.records  = deque() # appended by emit, popped by the writer. each is threadsafe without a lock
+        self.dropped  = 0
+        self.written  = 0
+        self.stopping = False
+        self.wake     = Event()
+        self.f        = gzip.open(path, 'wt') if path.endswith('.gz') else open(path, 'w')
+        self.writer   = Thread(target=self.write_batches, name='LW', daemon=True)
+        self.writer.start()
+
+    def emit(self, record):
+        # called with the handler's lock held, so the drop count is safe
+        records = self.records
+        if len(records) >= self.capacity:
+            self.dropped += 1
+            return
+        record.msg  = record.getMessage()
+        record.args = None
+        records.append(record)
+        if len(records) >= LOG_BATCH_RECORDS: self.wake.set()
+
+    def write_batches(self):
+        while True:
+            self.wake.wait(LOG_FLUSH_SECS)
+            self.wake.clear()
+            stopping = self.stopping # read before the batch, so whatever was queued before close is in it
+            self.write_batch()
+            if stopping: return
+
+    def write_batch(self):
+        records = self.records
+        lines   = [self.format(records.popleft()) for i in range(len(records))]
+        if not lines: return
+        lines.append('')
+        self.f.write('\n'.join(lines))
+        self.f.flush()
+        self.written += len(lines) - 1
+
+    def close(self):
+        # writes whatever is still queued, and a last line of how many were dropped if any, then closes the file
+        self.stopping = True
+        self.wake.set()
+        self.writer.join()
+        if self.dropped:
+            self.f.write(self.format(logging.makeLogRecord({'levelname': 'WARNING', 'threadName': 'LW',
+                'msg': 'log sink dropped %i lines under overload, queue full at %i' % (self.dropped, self.capacity)})) + '\n')
+        self.f.close()
+        logging.Handler.close(self)
+
+
+class Clock:
+    # the time source behind every time(), sleep() and courier timer of the real time modes (temporal, async). with a
+    # scale of N, sim time passes N times faster than the wall clock, so the real concurrent code path can run an hour
+    # long scenario in minutes. sim timestamps start at the real time the clock was made, so stay epoch-like
+    def __init__(self, scale=1.0):
+        if not scale > 0:
+            raise ValueError('time_scale must be > 0: %s' % scale)
+        self.scale  = scale
+        self.origin = time()
+
+    def time(self):
+        if self.scale == 1.0: return time()
+        return self.origin + (time() - self.origin) * self.scale
+
+    def sleep(self, secs):
+        sleep(self.real(secs))
+
+    def real(self, secs):
+        # the wall clock seconds that secs of sim time take
+        return secs / self.scale
+
+clock = Clock() # time source of the real time modes. run() replaces it, per cfg.time_scale
+
+
+class AsyncQueue(asyncio.Queue):
+    # the kitchen queue in async mode. unbounded, so put never has to wait, which lets the same sync code that puts
+    # into the Queue or PriorityQueue of the other modes (OT, couriers) put into this one too
+    def put(self, item):
+        self.put_nowait(item)
+
+
+class CourierScheduler(Thread):
+    # temporal mode only. the one thread which fires every courier arrival at its time, from a min-heap of
+    # (wall clock, so time scaled) deadlines, rather than a Timer (a whole thread, sleeping) per dispatched courier. a daemon, stopped by MT
+    def __init__(self, **kwargs):
+        Thread.__init__(self, name='CT', daemon=True, **kwargs)
+        self.cond     = Condition()
+        self.heap     = [] # of (monotonic deadline, seq, courier_arrives args)
+        self.seq      = 0
+        self.stopping = False
+
+    def schedule(self, delay, args):
+        with self.cond:
+            heappush(self.heap, (monotonic() + clock.real(delay), self.seq, args))
+            self.seq += 1
+            self.cond.notify()
+
+    def stop(self):
+        with self.cond:
+            self.stopping = True
+            self.cond.notify()
+
+    def run(self):
+        while True:
+            with self.cond:
+                while True:
+                    if self.stopping: # any couriers still pending are dropped. normally none are, by then
+                        return
+                    if self.heap:
+                        wait = self.heap[0][0] - monotonic()
+                        if wait <= 0: break
+                    else:
+                        wait = None
+                    self.cond.wait(wait)
+                args = heappop(self.heap)[2]
+            courier_arrives(*args) # outside the lock, so KT can schedule more meanwhile
+
+
+class OrderRecord:
+    # everything the kitchen tracks about one order's lifecycle, in one compact object, rather than spread over
+    # parallel dicts keyed by its uuid string. it's keyed by its int position in the orders input, and its temp and
+    # location are int codes (see LOC_NAMES). the raw order isn't kept, only the fields the handlers use. logs and
+    # outcomes rebuild it, as order
+    __slots__ = ('pos', 'id', 'name', 'temp', 'loc', 'shelf_life', 'decay_rate', 'ready', 'arrival', 'deadline', 'slot', 'extra')
+
+    def __init__(self, pos, order, ready):
+        self.pos        = pos
+        self.id         = order['id']
+        self.name       = sys.intern(order['name']) # there are few, so every order of one shares it
+        self.temp       = TEMP_CODES.get(order['temp'], NOSHELF)
+        self.loc        = NOSHELF # until the kitchen shelves (or drops) it
+        self.shelf_life = order['shelfLife']
+        self.decay_rate = order['decayRate']
+        self.ready      = ready   # float timestamp when became ready to eat/pickup
+        self.arrival    = None    # float timestamp when its courier arrived
+        self.deadline   = None    # when its value reaches 0, on its current shelf. only while shelved
+        self.slot       = None    # its index into its shelf's ShelfArrays, if the shelf has them. only while shelved
+        self.extra      = None    # any fields beyond ORDER_FIELDS, and a temp with no shelf, as given. rare
+        if len(order) > len(ORDER_FIELDS) or self.temp == NOSHELF:
+            self.extra = {k: v for k, v in order.items() if k not in ORDER_FIELDS or k == 'temp'}
+
+    @property
+    def order(self):
+        # the order, as it was given, rebuilt
+        order = {'id': self.id, 'name': self.name, 'temp': LOC_NAMES[self.temp], 'shelfLife': self.shelf_life, 'decayRate': self.decay_rate}
+        if self.extra is not None:
+            order.update(self.extra)
+        return order
+
+    def __str__(self): # as the order, so a log line formats it only if it's emitted
+        return str(self.order)
+
+    def __repr__(self):
+        return 'OrderRecord(%i, %s, %s)' % (self.pos, self.id, LOC_NAMES[self.loc])
+
+
+class Variates:
+    # a seeded stream of random variates, drawn in chunks. with numpy, VARIATES_CHUNK of them per vectorized call,
+    # rather than a random call per order. without, from a Random, behind the same interface. the same seed gives
+    # the same stream either way, but a different stream with numpy than without
+    def __init__(self, seed=None):
+        self.rng          = np.random.default_rng(seed) if np is not None else Random(seed)
+        self.uniforms     = iter(())
+        self.exponentials = iter(())
+
+    def uniform(self, lo, hi):
+        u = next(self.uniforms, None)
+        if u is None:
+            self.uniforms = iter(self.rng.random(VARIATES_CHUNK).tolist() if np is not None
+                                 else [self.rng.random() for i in range(VARIATES_CHUNK)])
+            u = next(self.uniforms)
+        return lo + (hi - lo) * u
+
+    def exponential(self):
+        # mean 1
+        e = next(self.exponentials, None)
+        if e is None:
+            self.exponentials = iter(self.rng.standard_exponential(VARIATES_CHUNK).tolist() if np is not None
+                                     else [self.rng.expovariate(1.0) for i in range(VARIATES_CHUNK)])
+            e = next(self.exponentials)
+        return e
+
+
+class Arrivals:
+    # the order arrival process: the gap from each order to the next, per cfg.arrival_process. constant is
+    # 1/order_rate apart, poisson is exponential gaps at order_rate, and profile is poisson at a piecewise constant
+    # rate, per cfg.arrival_profile, eg. by time of day. a kitchen of a fleet gets its share of the rate, as when a
+    # poisson stream is split at random, so each kitchen's runs apart from the rest
+    def __init__(self, seed=None):
+        self.process  = cfg['arrival_process']
+        self.rate     = cfg['order_rate']
+        self.variates = Variates(seed)
+        if self.process == 'profile':
+            profile = cfg['arrival_profile']
+            self.starts = [float(start) for start, rate in profile]
+            self.rates  = [float(rate) for start, rate in profile]
+            self.period = cfg['arrival_profile_period']
+            if not profile or self.starts[0] != 0 or self.starts != sorted(self.starts):
+                raise ValueError('arrival_profile must be pieces of (start, rate), sorted, starting at 0')
+            if any(not 0 <= r < float('inf') for r in self.rates) or not any(self.rates) \
+                    or (self.period is None and not self.rates[-1]):
+                raise ValueError('arrival_profile rates must be finite, >= 0, and not end at 0 for good')
+        elif self.process not in ('constant', 'poisson'):
+            raise ValueError('unknown arrival_process: %s' % self.process)
+        if cfg['kitchens'] > 1:
+            share = cfg['kitchen_share']
+            if share is None:
+                share = 1.0 / cfg['kitchens']
+            self.rate *= share
+            if self.process == 'profile':
+                self.rates = [rate * share for rate in self.rates]
+
+    def gap(self, t):
+        # secs from the order placed at t (sim secs since the first was) til the next
+        if self.process == 'constant':
+            return (self.rate == float('inf')) and 0 or (1.0 / self.rate)
+        if self.process == 'poisson':
+            return (self.rate == float('inf')) and 0 or (self.variates.exponential() / self.rate)
+        # spends one mean-1 exponential of work across the profile's pieces, each at its own rate. exact
+        work, t0 = self.variates.exponential(), t
+        while True:
+            rate, end = self.piece(t)
+            if rate > 0 and (end == float('inf') or rate * (end - t) >= work):
+                return t + work / rate - t0
+            work -= rate * (end - t)
+            t = end
+
+    def piece(self, t):
+        # the profile's rate at t, and when that piece of it ends
+        base = self.period and (t - t % self.period) or 0.0
+        i = bisect_right(self.starts, t - base) - 1
+        end = self.starts[i+1] if i + 1 < len(self.starts) else (self.period or float('inf'))
+        return self.rates[i], base + end
+
+
+def uuid_str(b):
+    # 16 bytes in the canonical UUID form, as str(UUID(bytes=b)) would, but faster
+    h = b.hex()
+    return '%s-%s-%s-%s-%s' % (h[:8], h[8:12], h[12:16], h[16:20], h[20:])
+
+
+class ColumnarOrders:
+    # an orders file in the columnar binary format, memory mapped. after its magic and header come fixed-width columns,
+    # one per field (see COLUMNAR_COLUMNS), then a JSON string table that the names and temps index into. so an order
+    # is pulled by index, its fields unpacked straight out of the page cache, with no parsing and no copy of the file.
+    # and every process reading the file shares the one cached copy. see write_columnar_orders
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.mm[:len(COLUMNAR_MAGIC)] != COLUMNAR_MAGIC:
+            raise ValueError('not a columnar orders file: %s' % path)
+        self.count, table_offset, table_size = COLUMNAR_HEADER.unpack_from(self.mm, len(COLUMNAR_MAGIC))
+        self.strings = json_loads(self.mm[table_offset:table_offset+table_size].decode())
+        self.offsets = {} # field -> its column's offset
+        offset = len(COLUMNAR_MAGIC) + COLUMNAR_HEADER.size
+        for name, st in COLUMNAR_COLUMNS.items():
+            self.offsets[name] = offset
+            offset += st.size * self.count
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        # unmaps the file. after every iterator over it is done with
+        self.mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        return self.order(*(st.unpack_from(self.mm, self.offsets[name] + i * st.size)[0] for name, st in COLUMNAR_COLUMNS.items()))
+
+    def column(self, name, start=0):
+        # a column's values, from index start, each unpacked straight out of the map as it's walked
+        st = COLUMNAR_COLUMNS[name]
+        return st.iter_unpack(memoryview(self.mm)[self.offsets[name] + start * st.size : self.offsets[name] + self.count * st.size])
+
+    def iter_from(self, start=0, kitchen=0, kitchens=1):
+        # in order, from index start. given kitchens, only the kitchen's orders. the others' rows are passed over unbuilt
+        cols  = [self.column(name, start) for name in COLUMNAR_COLUMNS]
+        order = self.order
+        if kitchens == 1:
+            for (oid,), (life,), (decay,), (name,), (temp,), (k,) in zip(*cols):
+                yield order(oid, life, decay, name, temp, k)
+            return
+        for row_kitchen, ((oid,), (life,), (decay,), (name,), (temp,), (k,)) in zip(self.row_kitchens(kitchens, start), zip(*cols)):
+            if row_kitchen == kitchen:
+                yield order(oid, life, decay, name, temp, k)
+
+    def iter_rows(self, rows):
+        # the orders of just these rows, in their order
+        for i in rows:
+            yield self[i]
+
+    def row_kitchens(self, kitchens, start=0):
+        # each row's kitchen of the fleet, from index start, as order_kitchen would give for its order, without building it
+        for (oid,), (k,) in zip(self.column('id', start), self.column('kitchen', start)):
+            yield k % kitchens if k >= 0 else crc32(uuid_str(oid).encode()) % kitchens
+
+    def __iter__(self):
+        return self.iter_from(0)
+
+    def order(self, oid, life, decay, name, temp, kitchen):
+        # the order dict, from its column values
+        order = {
+            'id'       : uuid_str(oid),
+            'name'     : self.strings[name],
+            'temp'     : self.strings[temp],
+            'shelfLife': int(life) if life.is_integer() else life,
+            'decayRate': decay}
+        if kitchen >= 0:
+            order['kitchen'] = kitchen
+        return order
+
+
+class ShelfArrays:
+    # a shelf's orders as parallel numpy arrays of ready time, shelf life and decay rate, one slot per order, so
+    # the whole shelf is valued in one vectorized call rather than one order_value call per order. freed slots
+    # are reused; used marks the occupied ones
+    def __init__(self, decay_modifier):
+        self.decay_modifier = decay_modifier
+        self.recs       = [None] * SHELF_ARRAYS_MIN # by slot
+        self.free       = list(range(SHELF_ARRAYS_MIN - 1, -1, -1))
+        self.ready      = np.zeros(SHELF_ARRAYS_MIN)
+        self.shelf_life = np.ones(SHELF_ARRAYS_MIN)
+        self.decay_rate = np.zeros(SHELF_ARRAYS_MIN)
+        self.used       = np.zeros(SHELF_ARRAYS_MIN, dtype=bool)
+
+    def add(self, rec):
+        if not self.free: self.grow()
+        slot = self.free.pop()
+        self.recs[slot]       = rec
+        self.ready[slot]      = rec.ready
+        self.shelf_life[slot] = rec.shelf_life
+        self.decay_rate[slot] = rec.decay_rate
+        self.used[slot]       = True
+        rec.slot = slot
+
+    def discard(self, rec):
+        slot = rec.slot
+        self.recs[slot] = None
+        self.used[slot] = False
+        self.free.append(slot)
+        rec.slot = None
+
+    def grow(self):
+        n = len(self.recs)
+        self.recs.extend([None] * n)
+        self.free.extend(range(2*n - 1, n - 1, -1))
+        self.ready      = np.concatenate((self.ready,      np.zeros(n)))
+        self.shelf_life = np.concatenate((self.shelf_life, np.ones(n)))
+        self.decay_rate = np.concatenate((self.decay_rate, np.zeros(n)))
+        self.used       = np.concatenate((self.used,       np.zeros(n, dtype=bool)))
+
+    def values(self, now):
+        # order_value of every slot, free ones included (meaningless there). same float ops, in the same order, as
+        # order_value, so each result is identical to what it would return
+        decay = (now - self.ready) * self.decay_rate * self.decay_modifier
+        return (self.shelf_life - decay) / self.shelf_life
+
+    def expired(self, now):
+        return [self.recs[i] for i in np.flatnonzero(self.used & (self.values(now) <= 0))]
+
+
+class Shelf:
+    # order records ready for pickup on one shelf. keyed by interned order id, keeping the order they were added
+    # in, so that append, remove and membership are all O(1) rather than list scans with dict compares.
+    # if arrays is on (and numpy installed) it also keeps them in ShelfArrays, to value the whole shelf at once
+    def __init__(self, name, decay_modifier=1.0, arrays=False):
+        self.name   = name
+        self.orders = {}
+        self.decay_modifier = decay_modifier
+        self.arrays = ShelfArrays(decay_modifier) if arrays and np is not None else None
+
+    def append(self, rec):
+        self.orders[rec.pos] = rec
+        if self.arrays is not None: self.arrays.add(rec)
+
+    def remove(self, rec):
+        del self.orders[rec.pos]
+        if self.arrays is not None: self.arrays.discard(rec)
+
+    def first(self):
+        return next(iter(self.orders.values()))
+
+    def valued(self, now):
+        # (rec, value) for every order on the shelf, in shelf order
+        if self.arrays is not None:
+            values = self.arrays.values(now).tolist()
+            return [(o, values[o.slot]) for o in self.orders.values()]
+        return [(o, order_value(now - o.ready, o.shelf_life, o.decay_rate, self.decay_modifier)) for o in self.orders.values()]
+
+    def expired(self, now):
+        # the orders whose value has reached 0, so should be wasted
+        if self.arrays is not None:
+            return self.arrays.expired(now)
+        return [o for o in self.orders.values() if order_value(now - o.ready, o.shelf_life, o.decay_rate, self.decay_modifier) <= 0]
+
+    def __contains__(self, rec):
+        return rec.pos in self.orders
+
+    def __iter__(self):
+        return iter(self.orders.values())
+
+    def __len__(self):
+        return len(self.orders)
+
+
+class ValueTournament:
+    # kinetic tournament tree, to find the order of least current value among many without valuing them all.
+    # on one shelf an order's value falls linearly with time, so the least valued is the one whose decay line
+    # a*t+b (a = decay_rate * modifier / shelf_life, b = -a * ready) is highest at t. each internal node holds the
+    # winner of its two children as of self.now, plus a certificate: when its loser would overtake it (if ever).
+    # advancing time only recomputes the nodes whose certificates have failed, each along its path to the root.
+    # so add, discard and least are O(log n), plus the (amortized) certificate failures since the last call
+    def __init__(self, decay_modifier):
+        self.decay_modifier = decay_modifier
+        self.now   = None # time the tree is correct as of
+        self.slots = {}   # by rec.pos
+        self.reset(SHELF_ARRAYS_MIN)
+
+    def reset(self, size):
+        # size is a power of 2. leaves are nodes size..2*size-1, one per slot. root is node 1
+        self.size    = size
+        self.recs    = [None] * size
+        self.lines   = [None] * size # (a, b) by slot
+        self.free    = list(range(size - 1, -1, -1))
+        self.winner  = [-1] * (2 * size) # slot, by node. -1 if none below
+        self.version = [0] * (2 * size)  # by node, so stale certificates are skipped
+        self.certs   = []                # min-heap of (fail time, node, version)
+
+    def add(self, rec):
+        if self.now is None: self.now = rec.ready
+        if not self.free: self.grow()
+        slot = self.free.pop()
+        a = rec.decay_rate * self.decay_modifier / rec.shelf_life
+        self.recs[slot]  = rec
+        self.lines[slot] = (a, -a * rec.ready)
+        self.slots[rec.pos] = slot
+        self.winner[self.size + slot] = slot
+        self.update_path(self.size + slot)
+
+    def discard(self, rec):
+        slot = self.slots.pop(rec.pos)
+        self.recs[slot]  = None
+        self.lines[slot] = None
+        self.free.append(slot)
+        self.winner[self.size + slot] = -1
+        self.update_path(self.size + slot)
+
+    def least(self, now):
+        self.advance(now)
+        w = self.winner[1]
+        return self.recs[w] if w >= 0 else None
+
+    def advance(self, now):
+        if self.now is None or now < self.now: return
+        self.now = now
+        certs = self.certs
+        while certs and certs[0][0] < now: # failed at or before now. ties at now need no swap
+            fail, node, version = heappop(certs)
+            if version == self.version[node]:
+                self.update_path(node * 2)
+        if len(certs) > 4 * self.size:
+            self.certs = [c for c in certs if c[2] == self.version[c[1]]]
+            heapify(self.certs)
+
+    def update_path(self, node):
+        # recomputes the ancestors of node, up to the root
+        node >>= 1
+        while node:
+            self.recompute(node)
+            node >>= 1
+
+    def recompute(self, node):
+        l, r = self.winner[2*node], self.winner[2*node + 1]
+        self.version[node] += 1
+        if l < 0 or r < 0:
+            self.winner[node] = max(l, r)
+            return
+        t = self.now
+        (al, bl), (ar, br) = self.lines[l], self.lines[r]
+        kl, kr = al*t + bl, ar*t + br
+        if kl > kr or (kl == kr and self.recs[l].pos < self.recs[r].pos): # ties go to the older order
+            w, aw, bw, ao, bo = l, al, bl, ar, br
+        else:
+            w, aw, bw, ao, bo = r, ar, br, al, bl
+        self.winner[node] = w
+        if ao > aw: # the loser's value falls faster, so will overtake. never before t, whatever the float rounding
+            heappush(self.certs, (max(t, (bw - bo) / (ao - aw)), node, self.version[node]))
+
+    def grow(self):
+        # doubles the slots, and rebuilds the tree as of self.now. O(n) but amortized over the adds that filled it
+        recs, lines, size = self.recs, self.lines, self.size
+        self.reset(2 * size)
+        self.recs[:size]  = recs
+        self.lines[:size] = lines
+        self.free = list(range(2*size - 1, size - 1, -1))
+        for slot in range(size):
+            self.winner[self.size + slot] = slot if recs[slot] is not None else -1
+        for node in range(self.size - 1, 0, -1):
+            self.recompute(node)
+
+
+class OverflowShelf(Shelf):
+    # also indexes its orders by ideal temp, so finding one to move back to a temp shelf which has space is O(1).
+    # and, per its eviction policy, which order to drop when full: fifo (the first added), least_value (least current
+    # value, via a ValueTournament) or soonest_expiry (earliest deadline, via a lazy min-heap). all O(log n) or better
+    def __init__(self, name, decay_modifier=1.0, arrays=False, eviction='fifo'):
+        Shelf.__init__(self, name, decay_modifier, arrays)
+        self.by_temp = tuple({} for t in SINGLE_TEMPS) # by temp code
+        if eviction not in ('fifo', 'least_value', 'soonest_expiry'):
+            raise ValueError('unknown overflow_eviction: %s' % eviction)
+        self.eviction   = eviction
+        self.tournament = ValueTournament(decay_modifier) if eviction == 'least_value' else None
+        self.deadlines  = [] # min-heap of (deadline, seq, rec), if soonest_expiry. stale entries skipped lazily
+        self.seq        = 0
+
+    def append(self, rec):
+        Shelf.append(self, rec)
+        self.by_temp[rec.temp][rec.pos] = rec
+        if self.tournament is not None:
+            self.tournament.add(rec)
+        elif self.eviction == 'soonest_expiry':
+            deadline = order_deadline(rec.ready, rec.shelf_life, rec.decay_rate, self.decay_modifier)
+            heappush(self.deadlines, (deadline, self.seq, rec))
+            self.seq += 1
+
+    def remove(self, rec):
+        Shelf.remove(self, rec)
+        del self.by_temp[rec.temp][rec.pos]
+        if self.tournament is not None:
+            self.tournament.discard(rec)
+        elif self.eviction == 'soonest_expiry' and len(self.deadlines) > 2 * len(self) + 64:
+            self.deadlines = [e for e in self.deadlines if self.orders.get(e[2].pos) is e[2]]
+            heapify(self.deadlines)
+
+    def first_of_temp(self, temp):
+        orders = self.by_temp[temp]
+        return orders and next(iter(orders.values())) or None
+
+    def evictee(self, now):
+        # the order to drop to make room, per the eviction policy. None if empty
+        if not len(self): return None
+        if self.tournament is not None:
+            return self.tournament.least(now)
+        if self.eviction == 'soonest_expiry':
+            deadlines = self.deadlines
+            while self.orders.get(deadlines[0][2].pos) is not deadlines[0][2]: # stale. it left the shelf since
+                heappop(deadlines)
+            return deadlines[0][2]
+        return self.first()
+
+
+class Metrics:
+    # a registry of named, typed metrics: counters, which only ever go up, and gauges, levels which go up and down.
+    # each is read by a function only when sampled, so a metric costs nothing per event
+    def __init__(self):
+        self.names   = []
+        self.kinds   = {} # name -> 'counter' or 'gauge'
+        self.readers = []
+
+    def counter(self, name, read):
+        self.add(name, 'counter', read)
+
+    def gauge(self, name, read):
+        self.add(name, 'gauge', read)
+
+    def add(self, name, kind, read):
+        if name in self.kinds:
+            raise ValueError('metric already registered: %s' % name)
+        self.names.append(name)
+        self.kinds[name] = kind
+        self.readers.append(read)
+
+    def sample(self):
+        # every metric's current value, in registration order
+        return [read() for read in self.readers]
+
+    def snapshot(self):
+        return dict(zip(self.names, self.sample()))
+
+
+class MetricsSeries:
+    # appends samples of a Metrics to a time-series file, one row per every sim seconds, as CSV or NDJSON. the file is
+    # opened on the first row. a checkpoint saves where it got to, and a resume truncates back to there, so no row repeats
+    def __init__(self, path, fmt, every, metrics):
+        if fmt not in ('csv', 'ndjson'):
+            raise ValueError('unknown metrics_format: %s' % fmt)
+        if not every > 0:
+            raise ValueError('metrics_every_simtime must be > 0: %s' % every)
+        self.path   = path
+        self.format = fmt
+        self.every  = every
+        self.names  = list(metrics.names)
+        self.kinds  = dict(metrics.kinds)
+        self.rows   = 0    # written so far. the next is due at rows * every sim secs since the start
+        self.f      = None
+        self.offset = 0    # bytes written as of the last checkpoint
+
+    def due(self):
+        return self.rows * self.every
+
+    def write(self, t, values):
+        if self.f is None:
+            self.f = open(self.path, 'wb')
+            if self.format == 'csv':
+                self.f.write(('t,' + ','.join(self.names) + '\n').encode())
+            else: # a header line of the metric kinds, like an orders file's total header
+                self.f.write((json_dumps({'metrics': self.kinds}) + '\n').encode())
+        if self.format == 'csv':
+            self.f.write(('%r,' % t + ','.join(map(repr, values)) + '\n').encode())
+        else:
+            row = {'t': t}
+            row.update(zip(self.names, values))
+            self.f.write((json_dumps(row) + '\n').encode())
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
+
+    def __getstate__(self):
+        state = dict(self.__dict__, f=None)
+        if self.f is not None:
+            self.f.flush()
+            state['offset'] = self.f.tell()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.offset: # resumed. carry on from just after the last row before the checkpoint
+            self.f = open(self.path, 'r+b')
+            self.f.truncate(self.offset)
+            self.f.seek(self.offset)
+
+
+class TraceWriter:
+    # records every event KT handles, in the order it handled them, as fixed-width binary records. enough to feed
+    # the same events back into the handlers later, with no threads, timers or random draws. see replay().
+    # the file is opened on the first record. like MetricsSeries, a checkpoint saves where it got to, and a resume
+    # truncates back to there, so the trace carries on with the events handled after the checkpoint
+    def __init__(self, path, started):
+        self.path    = path
+        self.started = started
+        self.f       = None
+        self.offset  = 0 # bytes written as of the last checkpoint
+
+    def record(self, code, now, pos, delay):
+        if self.f is None: self.open()
+        self.f.write(TRACE_RECORD.pack(code, now, pos, delay))
+
+    def open(self):
+        self.f = open(self.path, 'wb')
+        self.f.write(TRACE_MAGIC + TRACE_HEADER.pack(self.started))
+
+    def close(self):
+        if self.f is None: self.open() # no events, but still a valid trace
+        self.f.close()
+
+    def __getstate__(self):
+        state = dict(self.__dict__, f=None)
+        if self.f is not None:
+            self.f.flush()
+            state['offset'] = self.f.tell()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.offset: # resumed. carry on from just after the last record before the checkpoint
+            self.f = open(self.path, 'r+b')
+            self.f.truncate(self.offset)
+            self.f.seek(self.offset)
 
 
 class OrderingThread(Thread):
@@ -33,55 +852,115 @@ class OrderingThread(Thread):
         self.started   = None
         self.now       = now
         self.exception = None
+        self.placed    = 0 # orders put into the kitchen queue so far
+        self.arrivals  = Arrivals(kitchen_seed(1)) # own stream, apart from couriers
 
     def run(self):
         try:
             self.started = self.now = self.time()
             self.log(INFO, 'started')
-            if cfg['order_rate'] <= 0:
-                self.log(INFO, 'order_rate <= 0, will not place orders')
-            else:
-                approx_flag = (cfg['concurrency'] == 'temporal') and '~' or ''
-                orders = self.read_orders()
-                for o, order in enumerate(orders, 1):
-                    now = self.time()
-                    timerel = now - self.started
-                    pause_between_orders = (cfg['order_rate'] == float('inf')) and 0 or (1.0 / cfg['order_rate'])
-                    ot = now
-                    p = (cfg['concurrency'] == 'temporal') and TEMPORAL_P or ot
-                    new_kqueue_size = self.kitchenQ.qsize() + 1 # estimate. not strictly guaranteed to always be correct. due to KT and OT threads running concurrently, producing into and consuming out of the same queue in parallel
-
-                    self.log(INFO, 'placed order: %i, %s, %s, new kqueue ~%i, now %f/+%f, order %s%f/+%f' % (o, order['id'], order['name'], new_kqueue_size, now, timerel, approx_flag, ot, ot-self.started))
-                    self.kitchenQ.put((p, ('order_received', o, order))) #TODO add counter here of orders-submitted?
-                    #if o == 2: break #TODO make this a devtest feature via config or main/sys args
-                    if o < len(orders): # don't add a pause or time gap if this was the last order
-                        if cfg['concurrency'] == 'temporal': sleep(pause_between_orders)
-                        else: self.now += pause_between_orders # priority
+            for pause_between_orders in self.place_orders():
+                if cfg['concurrency'] == 'temporal': clock.sleep(pause_between_orders)
+                else: self.now += pause_between_orders # priority
             self.log(INFO, 'exits')
         except BaseException as ex:
             self.exception = ex
             logging.exception(ex) #TODO 1-line. app log format
             raise
 
-    def read_orders(self): #TODO refactor from all-at-once to iterable/stream
+    async def run_async(self):
+        # async mode's run(). a coroutine on MT's event loop, which awaits each pause rather than sleeping the thread
+        try:
+            self.started = self.now = self.time()
+            self.log(INFO, 'started')
+            for pause_between_orders in self.place_orders():
+                await asyncio.sleep(clock.real(pause_between_orders))
+            self.log(INFO, 'exits')
+        except BaseException as ex:
+            self.exception = ex
+            logging.exception(ex) #TODO 1-line. app log format
+            raise
+
+    def place_orders(self):
+        # puts one order_received event into the kitchen queue per order, then yields the pause to take before the next.
+        # the caller decides how that pause passes: a real sleep, or advancing the simulated now
+        if cfg['order_rate'] <= 0 and cfg['arrival_process'] != 'profile':
+            self.log(INFO, 'order_rate <= 0, will not place orders')
+            return
+        approx_flag = is_realtime() and '~' or ''
+        orders = self.read_orders(self.placed) # nonzero if resumed from a checkpoint. read again to just after those
+        order = next(orders, None)
+        o = self.placed
+        while order is not None:
+            o += 1
+            next_order = next(orders, None) # look ahead one, only to know if this is the last
+            now = self.time()
+            timerel = now - self.started
+            pause_between_orders = self.arrivals.gap(now - self.started)
+            ot = now
+            p = is_realtime() and TEMPORAL_P or ot
+            new_kqueue_size = self.kitchenQ.qsize() + 1 # estimate. not strictly guaranteed to always be correct. due to KT and OT threads running concurrently, producing into and consuming out of the same queue in parallel
+
+            self.log(INFO, 'placed order: %i, %s, %s, new kqueue ~%i, now %f/+%f, order %s%f/+%f', o, order['id'], order['name'], new_kqueue_size, now, timerel, approx_flag, ot, ot-self.started)
+            self.kitchenQ.put(stamped((p, EV_ORDER_RECEIVED, o, order))) #TODO add counter here of orders-submitted?
+            self.placed = o
+            #if o == 2: break #TODO make this a devtest feature via config or main/sys args
+            if next_order is not None: # don't add a pause or time gap if this was the last order
+                yield pause_between_orders
+            order = next_order
+
+    def read_orders(self, skip=0):
+        # returns an iterator over the orders, which yields them one at a time. a file is streamed, never loaded whole.
+        # skip is how many to pass over first, eg. those already placed before a checkpoint. a kitchen of a fleet gets
+        # just its own orders: its share of a synthetic stream, or the rows split for it, or else those of the source
+        # which are its, per order_kitchen
+        kitchens, kitchen = cfg['kitchens'], cfg['kitchen']
+        if not 0 <= kitchen < kitchens:
+            raise ValueError('kitchen must be in 0 to kitchens-1: %s of %s' % (kitchen, kitchens))
+        own = kitchens == 1 # whether the orders are all this kitchen's, else they're filtered for its own
         if cfg['orders_literal'] is not None: # in case they were injected by a test
             self.log(INFO, 'cfg.orders_literal will be used instead of cfg.orders_file')
-            data = cfg['orders_literal']
-        else: # normal case
-            data = None
-            with open(cfg['orders_file']) as f:
-                data = json_load(f)
+            orders = cfg['orders_literal']
+            total = len(orders) if hasattr(orders, '__len__') else None
+        elif cfg['orders_source'] == 'synthetic':
+            total = cfg['synthetic_count']
+            if total is None and cfg['concurrency'] == 'priority':
+                raise ValueError('unbounded synthetic orders need des, temporal or async concurrency, since priority mode queues every order first')
+            if total is not None and kitchens > 1:
+                total = total // kitchens + (kitchen < total % kitchens)
+            orders, own = synthetic_orders(total, kitchen_seed(2)), True # own stream, per kitchen
+        elif cfg['orders_source'] == 'file' and is_columnar_orders(cfg['orders_file']): # mapped, not parsed
+            orders = ColumnarOrders(cfg['orders_file'])
+            total  = len(orders)
+            if cfg['orders_rows'] is not None:
+                total = len(cfg['orders_rows'])
+                orders, skip, own = orders.iter_rows(cfg['orders_rows'][skip:]), 0, True
+            elif kitchens > 1:
+                orders, total, own = orders.iter_from(0, kitchen, kitchens), None, True
+            else:
+                orders, skip = orders.iter_from(skip), 0
+        elif cfg['orders_source'] == 'file': # normal case
+            total = read_orders_total(cfg['orders_file'])
+            if total is None and cfg['orders_count_pass']:
+                total = count_orders(cfg['orders_file'])
+            orders = iter_orders(cfg['orders_file'])
+        else:
+            raise ValueError('unknown orders_source: %s' % cfg['orders_source'])
+        if not own:
+            orders, total = (order for order in orders if order_kitchen(order, kitchens) == kitchen), None
 
-        #self.log(DEBUG, json.dumps(data,indent=2))
-        self.log(INFO, 'total orders to place: %i' % len(data))
-        return data
+        self.log(INFO, 'total orders to place: %s', total if total is not None else 'unknown')
+        if skip:
+            return islice(orders, skip, None)
+        return iter(orders)
 
     def time(self):
-        return cfg['concurrency'] == 'temporal' and time() or self.now
+        return is_realtime() and clock.time() or self.now
 
     def log(self, level, message, *args, **kwargs):
+        if not log_enabled(level): return
         timerel = self.time() - self.started # real time only in temporal mode; in priority mode its a simulated time diff
-        log(level, "+%5.6f:  %s" % (timerel,message), *args, **kwargs)
+        log(level, "+%5.6f:  " + message, timerel, *args, **kwargs)
 
 
 class KitchenThread(Thread):
@@ -92,9 +971,14 @@ class KitchenThread(Thread):
         self.started    = None
         self.now        = now
         self.exception  = None
+        self.status_at  = now # sim time of the last sampled STATUS
 
         if cfg['concurrency'] == 'temporal':
             self.q = Queue()         # threadsafe unbounded FIFO
+        elif cfg['concurrency'] == 'async':
+            self.q = AsyncQueue()    # unbounded FIFO on the event loop
+        elif cfg['concurrency'] == 'des':
+            self.q = EventHeap()     # single-threaded priority, no locks
         else: # priority
             self.q = PriorityQueue() # threadsafe unbounded priority
 
@@ -103,33 +987,103 @@ class KitchenThread(Thread):
         self.shelf_names = tuple(sns)
 
         self.shelves = {} # orders ready for delivery pickup by couriers, by shelf
-        for sn in self.shelf_names:
-            self.shelves[sn] = []
+        for sn in SINGLE_TEMPS:
+            self.shelves[sn] = Shelf(sn, SHELF_DECAY_MODIFIERS[LOC_CODES[sn]], cfg['shelf_arrays'])
+        self.shelves['overflow'] = OverflowShelf('overflow', SHELF_DECAY_MODIFIERS[OVERFLOW], cfg['shelf_arrays'], cfg['overflow_eviction'])
+        self.shelf_list = tuple(self.shelves[LOC_NAMES[c]] for c in SHELF_CODES) # same shelves, by loc code
+        self.capacity   = tuple(cfg['shelf_capacity'][LOC_NAMES[c]] for c in SHELF_CODES)
 
         self.peaks   = {} # peak count of orders, by shelf
         for sn in self.shelf_names:
             self.peaks[sn] = 0
 
-        self.order_ready      = {}    # key is oid. value is float timestamp when became ready to eat/pickup
-        self.order_locs       = {}    # key is oid. value is shelf name if on a shelf, or, capdrop or wasted
-        self.capacity_dropped = []    # all capdropped orders
-        self.wasted           = []    # orders too old/stale for quality delivery
+        self.records          = {}    # key is pos. value is the order's OrderRecord, from when the kitchen received it. see retention
+        self.capacity_dropped = self.new_outcomes() # capdropped orders
+        self.wasted           = self.new_outcomes() # orders too old/stale for quality delivery
+        self.delivered        = self.new_outcomes() # orders picked up by their courier
+        self.retained         = cfg['retention'] != 'counters' # whether outcomes keep their orders, rebuilt
         self.courier_timers   = set() # all couriers who have been dispatched but not yet arrived for pickup
-        self.courier_arrivals = {}    # key is oid. value is float timestamp when the order's courier arrived
+        self.variates         = Variates(kitchen_seed()) # courier delays
+        self.scheduler        = CourierScheduler() if cfg['concurrency'] == 'temporal' else None # fires their arrivals
+        self.shelf_arrays     = cfg['shelf_arrays'] and np is not None # whole shelves valued at once. else the expiries heap
+        self.expiries         = []    # min-heap of (deadline, seq, rec) for shelved orders. stale entries skipped lazily
+        self.expiry_seq       = 0     # tie-breaker for expiries, so orders are never compared
+        self.trace            = cfg['trace_file'] and TraceWriter(cfg['trace_file'], now) or None
+        self.courier_delay    = 0.0   # of the courier last dispatched. for the trace
+        self.replaying        = False # if true courier delays come from a trace, and arrivals too. see replay()
+        self.handlers     = (self.handle_shutdown, self.handle_courier_arrived, self.handle_order_received) # by event code
+        self.event_counts = [0] * len(EVENT_NAMES) # events handled, by code
         self.counts = {
             'events'                  : 0,
             'unhand'                  : 0,
-            'event:order_received'    : 0,
             'noshelf'                 : 0,
+            'capdrops'                : 0,
             'ordercheck_wasted'       : 0,
             'couriers_dispatched'     : 0,
-            'event:courier_arrived'   : 0,
             'pickupfail_capdrop'      : 0,
             'pickupfail_wasted_prior' : 0,
             'pickupfail_wasted_now'   : 0,
             'pickupfail_badloc'       : 0,
-            'orders_delivered'        : 0,
-            'event:shutdown'          : 0}
+            'orders_delivered'        : 0}
+        self.metrics = self.new_metrics() # the counts above, and more, for the time-series file
+        self.latency    = None # by event type, a LogHistogram of the wall clock each took to handle. if cfg.latency_stats
+        self.queue_wait = None # ditto, of how long each waited in q, from its put til its get
+        if cfg['latency_stats']:
+            self.latency      = defaultdict(LogHistogram)
+            self.queue_wait   = defaultdict(LogHistogram)
+            self.handle_event = self.handle_event_timed
+        self.series  = cfg['metrics_file'] and MetricsSeries(cfg['metrics_file'], cfg['metrics_format'],
+                           cfg['metrics_every_simtime'], self.metrics) or None
+
+    def new_metrics(self):
+        # what STATUS reports, as typed metrics. each reads KT's state afresh, so they're right after a checkpoint resume
+        m = Metrics()
+        m.gauge('kqueue', lambda: self.q.qsize())
+        m.gauge('ctasks', lambda: len(self.courier_timers))
+        m.gauge('oready', lambda: len(self.records))
+        for sn in self.shelf_names:
+            m.gauge(sn,           lambda sn=sn: len(self.shelves[sn]))
+            m.gauge('peak_' + sn, lambda sn=sn: self.peaks[sn])
+        m.counter('wasted', lambda: self.counts['ordercheck_wasted'] + self.counts['pickupfail_wasted_now'])
+        for k in self.counts:
+            m.counter(k, lambda k=k: self.counts[k])
+        for code, name in enumerate(EVENT_NAMES):
+            m.counter('event:' + name, lambda code=code: self.event_counts[code])
+        return m
+
+    def all_counts(self):
+        # counts, plus the events handled of each type as 'event:<type>', as one flat dict
+        counts = dict(self.counts)
+        for code, name in enumerate(EVENT_NAMES):
+            counts['event:' + name] = self.event_counts[code]
+        return counts
+
+    def sample_metrics(self, final=False):
+        # a row for every sample time passed by now. the state hasn't changed since the last event, so they share values.
+        # and if final, one more at now itself, so the series ends with the final outcome
+        t = self.now - self.started
+        values = self.metrics.sample()
+        series = self.series
+        while series.due() <= t:
+            series.write(series.due(), values)
+            series.rows += 1
+        if final and series.due() - series.every < t:
+            series.write(t, values)
+
+    def new_outcomes(self):
+        # the orders which reached one terminal outcome, as many as cfg.retention keeps. counts are always kept regardless
+        if cfg['retention'] == 'full':     # every one. grows without bound, but tests like to look at them afterward
+            return []
+        elif cfg['retention'] == 'ring':   # only the latest N
+            return deque(maxlen=cfg['retention_ring_size'])
+        elif cfg['retention'] == 'counters':
+            return deque(maxlen=0)
+        raise ValueError('unknown retention: %s' % cfg['retention'])
+
+    def keep(self, outcomes, rec):
+        # the order, rebuilt, into the list of its outcome. only if it's kept
+        if self.retained:
+            outcomes.append(rec.order)
 
     def run(self):
         try:
@@ -147,238 +1101,336 @@ class KitchenThread(Thread):
             logging.exception(ex) #TODO 1-line. app log format
             raise
 
-    def handle_event(self, event):
-        self.counts['events'] += 1
+    async def run_async(self):
+        # async mode's run(). a coroutine on MT's event loop, which awaits each event rather than blocking the thread
+        try:
+            self.started = self.now = self.time()
+            self.log(INFO, 'started')
+            while self.should_run \
+                or self.q.qsize() \
+                or len(self.courier_timers):
+                event = await self.q.get()
+                self.handle_event(event)
+                self.q.task_done()
+            self.log(INFO, 'exits')
+        except asyncio.CancelledError: # by asyncio.run, as it unwinds because OT died. not a KT failure
+            raise
+        except BaseException as ex:
+            self.exception = ex
+            logging.exception(ex) #TODO 1-line. app log format
+            raise
+
+    def run_until(self, until):
+        # des mode only, called on MT. handles queued events, in time order, while they are scheduled before until
+        while self.q.qsize() and self.q.peek()[0] < until:
+            self.handle_event(self.q.get())
+
+    def drain(self):
+        # des mode only, called on MT. like run() but without a thread: handles events til shutdown and queue reach 0
+        while self.should_run or self.q.qsize():
+            self.handle_event(self.q.get())
+
+    def handle_event_timed(self, event):
+        # handle_event, timed, when cfg.latency_stats. and if the event was stamped when put, how long it sat in the queue
+        started = perf_counter()
+        etype   = EVENT_NAMES[event[1]]
+        if len(event) > 4:
+            self.queue_wait[etype].add(started - event[4])
+        KitchenThread.handle_event(self, event)
+        self.latency[etype].add(perf_counter() - started)
+
+    def log_latency(self):
+        # at WARNING, so the report asked for isn't dropped by a quieter log_level
+        for etype in sorted(self.latency):
+            h, w = self.latency[etype], self.queue_wait.get(etype)
+            log_mt(WARNING, 'latency %s: handled %i, p50 %s, p99 %s, max %s; queue wait %i, p50 %s, p99 %s, max %s', etype,
+                   h.n, usecs(h.quantile(0.5)), usecs(h.quantile(0.99)), usecs(h.max),
+                   *(w and (w.n, usecs(w.quantile(0.5)), usecs(w.quantile(0.99)), usecs(w.max)) or (0, '-', '-', '-')))
 
+    def handle_event(self, event):
         # the 1st field of the event represents priority.
         # used by PriorityQueue to rank entries & simulate correct temporal order of events.
         # it is ignored in temporal mode and not used by Queue but populated for consistency.
         # look at the impl of self.time() to better understand why we do the assignment below
         p = event[0]
         if p != SHUTDOWN_P:
-            self.now = (cfg['concurrency'] == 'temporal') and time() or p
-
-        etype = event[1][0]
+            self.now = is_realtime() and clock.time() or p
 
-        self.counts['event:'+etype] += 1
+        # any metrics samples due by now are of the state before this event, which is the state at their times
+        if self.series is not None and self.now - self.started >= self.series.due(): self.sample_metrics()
 
-        self.log(INFO, 'kitchen handle_event: %s' % str(event))
-        self.status()
+        self.counts['events'] += 1
 
-        if   etype == 'shutdown':
-            self.should_run = False
-            self.log(DEBUG, 'kitchen thread will stop when queue and timers reach 0')
-        elif etype == 'order_received':
-            self.handle_order_received(event)
-        elif etype == 'courier_arrived':
-            self.handle_courier_arrived(event)
-        else:
-            self.log(ERROR, 'unhandled kitchen event: %s' % etype)
+        code = event[1]
+        if not 0 <= code < len(self.handlers):
+            self.log(ERROR, 'unhandled kitchen event: %s', event)
             self.counts['unhand'] += 1
+            return
+
+        self.event_counts[code] += 1
+
+        self.log(INFO, 'kitchen handle_event: %s, %s', EVENT_NAMES[code], event)
+        if self.status_due(): self.status()
+
+        self.handlers[code](event)
+
+        if self.trace is not None:
+            if code == EV_ORDER_RECEIVED:
+                self.trace.record(code, self.now, event[2], cfg['courier_dispatch_enabled'] and self.courier_delay or 0.0)
+            else:
+                self.trace.record(code, self.now, code == EV_COURIER_ARRIVED and event[3].pos or 0, 0.0)
+
+    def handle_shutdown(self, event):
+        self.should_run = False
+        self.log(DEBUG, 'kitchen thread will stop when queue and timers reach 0')
 
     def handle_order_received(self, event):
-        etype = event[1][0]
-        pos   = event[1][1] # position within original orders input batch; 1-based since only human-read
-        order = event[1][2] #TODO consider cloning it so more threadsafe
+        code  = event[1]
+        pos   = event[2] # position within original orders input batch; 1-based since only human-read
+        order = event[3] #TODO consider cloning it so more threadsafe
+
+        now = self.now # as handle_event read it, once. so a trace of it replays exactly, realtime modes included
+        rec = self.receive_order(pos, order, now)
 
         if cfg['courier_dispatch_enabled']:
-            self.dispatch_courier(etype,pos,order) # upon receiving order, kitchen immed dispatches courier to pickup & deliver specific order
+            self.dispatch_courier(code,rec) # upon receiving order, kitchen immed dispatches courier to pickup & deliver specific order
 
         oid                  = order['id']        # uuid (eg. "0ff534a7-a7c4-48ad-b6ec-7632e36af950")
-        name                 = order['name']      # like Cheese Pizza
-        temp                 = order['temp']      # Preferred shelf storage temperature (possible: cold, frozen, hot)
-        shelf_life           = order['shelfLife'] # Shelf wait max duration (seconds)
-        decay_rate           = order['decayRate'] # float fraction value as deterioration modifier
+        temp                 = rec.temp           # Preferred shelf storage temperature (possible: cold, frozen, hot)
         shelf_decay_modifier = 1.0                # assume normal until we know what shelf it ends up on
 
-        now = self.time()
-        self.order_ready[oid] = now
         order_age = 0
-        ovalue = order_value(order_age, shelf_life, decay_rate, shelf_decay_modifier) # should always be 1.0 here but nice to log
+        ovalue = order_value(order_age, rec.shelf_life, rec.decay_rate, shelf_decay_modifier) # should always be 1.0 here but nice to log
 
-        self.log(INFO, 'kitchen prepares order instantly, ready: order %i, %s, time %f, value %f' % (pos, oid, now, ovalue))
+        self.log(INFO, 'kitchen prepares order instantly, ready: order %i, %s, time %f, value %f', pos, oid, now, ovalue)
 
         self.check_orders_to_waste(now)
 
-        if temp not in self.shelves:
-            self.log(ERROR, 'order has no shelf for temp, no save: order %i, %s, %s' % (pos, oid, temp))
-            self.counts['noshelf'] += 1 #TODO if case can happen, also handle right downstream in handle_courier_arrived
+        if temp == NOSHELF:
+            self.log(ERROR, 'order has no shelf for temp, no save: order %i, %s, %s', pos, oid, order['temp'])
+            self.counts['noshelf'] += 1 # its courier will find it at badloc
             return
 
         if self.is_shelf_avail(temp): # if an order's ideal temp shelf has space, put it there
-            self.add_order_to_shelf(order,temp)
-            self.log(INFO, 'order added to ideal temp shelf: order %i, %s, %s' % (pos, oid, temp))
+            self.add_order_to_shelf(rec,temp)
+            self.log(INFO, 'order added to ideal temp shelf: order %i, %s, %s', pos, oid, LOC_NAMES[temp])
             return
 
-        if cfg['shelf_capacity']['overflow'] < 1:
+        if self.capacity[OVERFLOW] < 1:
             self.capacity_dropped.append(order)
-            self.order_locs[oid] = 'capdrop'
-            self.log(INFO, 'dropped new order because zero overflow capacity: order %i, %s, %s' % (pos, oid, temp))
+            self.counts['capdrops'] += 1
+            rec.loc = CAPDROP
+            self.log(INFO, 'dropped new order because zero overflow capacity: order %i, %s, %s', pos, oid, LOC_NAMES[temp])
             return
 
-        if self.is_shelf_avail('overflow'): # otherwise, if overflow has space, put it there
-            self.add_order_to_shelf(order,'overflow')
-            self.log(INFO, 'order added to overflow shelf: order %i, %s, %s' % (pos, oid, temp))
+        if self.is_shelf_avail(OVERFLOW): # otherwise, if overflow has space, put it there
+            self.add_order_to_shelf(rec,OVERFLOW)
+            self.log(INFO, 'order added to overflow shelf: order %i, %s, %s', pos, oid, LOC_NAMES[temp])
             return
 
-        # try to free space on overflow shelf by moving orders from there to their ideal temp shelf
-        os = list(self.shelves['overflow'])
-        for o in os:
-            t = o['temp']
-            if self.is_shelf_avail(t): # this overflow order's ideal temp shelf has space so move it there
-                self.shelves['overflow'].remove(o)
+        # try to free space on overflow shelf by moving orders from there to their ideal temp shelf.
+        # per temp shelf with space, its oldest overflow orders go first. O(1) per slot freed
+        overflow = self.shelf_list[OVERFLOW]
+        for t in (HOT, COLD, FROZEN):
+            while self.is_shelf_avail(t): # this temp shelf has space so move an overflow order of that temp there
+                o = overflow.first_of_temp(t)
+                if o is None: break
+                overflow.remove(o)
                 self.add_order_to_shelf(o,t)
-                self.log(INFO, 'order moved from overflow to ideal temp shelf: %s' % o)
+                self.log(INFO, 'order moved from overflow to ideal temp shelf: %s', o)
 
-        if self.is_shelf_avail('overflow'):
-            self.add_order_to_shelf(order,'overflow')
-            self.log(INFO, 'order added to newly free overflow shelf: order %i, %s, %s' % (pos, oid, temp))
+        if self.is_shelf_avail(OVERFLOW):
+            self.add_order_to_shelf(rec,OVERFLOW)
+            self.log(INFO, 'order added to newly free overflow shelf: order %i, %s, %s', pos, oid, LOC_NAMES[temp])
             return
 
-        # if overflow still isn't avail, then pick an order from it and discard, then place new order there
+        # if overflow still isn't avail, then pick an order from it and discard, then place new order there.
+        # which one depends on cfg.overflow_eviction
+
+        dropped = overflow.evictee(now)
 
-        dropped_order = self.shelves['overflow'][0] #TODO non-ideal. better to pick order with least current value, eg.
+        overflow.remove(dropped)
+        self.keep(self.capacity_dropped, dropped)
+        self.counts['capdrops'] += 1
+        dropped.loc = CAPDROP
 
-        self.shelves['overflow'].remove(dropped_order)
-        self.capacity_dropped.append(dropped_order)
-        self.order_locs[dropped_order['id']] = 'capdrop'
+        self.add_order_to_shelf(rec,OVERFLOW) # new order is ready to pickup, but on the overflow shelf
 
-        self.add_order_to_shelf(order,'overflow') # new order is ready to pickup, but on the overflow shelf
+        self.log(INFO, 'dropped overflow order to make room for new: order %i, new %s, dropped %s', pos, order, dropped)
 
-        self.log(INFO, 'dropped overflow order to make room for new: order %i, new %s, dropped %s' % (pos, order, dropped_order))
+    def receive_order(self, pos, order, now):
+        # starts the order's lifecycle record. it is ready (prepared instantly) as of now, but not yet shelved
+        rec = OrderRecord(pos, order, now)
+        self.records[pos] = rec
+        return rec
 
-    def dispatch_courier(self, etype, pos, order):
-        courier_arrival_delay = uniform(cfg['courier_arrival_min'], cfg['courier_arrival_max'])
-        oid = order['id']
-        arrival_time_approx = self.time() + courier_arrival_delay
-        orig_order_event = (etype, pos, order)
-        ct = self.prepare_courier_timer(oid, courier_arrival_delay, arrival_time_approx, orig_order_event)
+    def dispatch_courier(self, code, rec):
+        if self.replaying: # the delay the traced run drew, not a new one
+            courier_arrival_delay = self.courier_delay
+        else:
+            courier_arrival_delay = self.variates.uniform(cfg['courier_arrival_min'], cfg['courier_arrival_max'])
+            self.courier_delay    = courier_arrival_delay
+        oid = rec.id
+        arrival_time_approx = self.now + courier_arrival_delay
+        ct = rec.pos # the courier's token, tracked in courier_timers til its arrival event is handled. same in every mode
         self.courier_timers.add(ct)
         self.counts['couriers_dispatched'] += 1
-        approx_flag = (cfg['concurrency'] == 'temporal') and '~' or ''
-        self.log(INFO, 'dispatching courier: order %i, %s, new ctimers %i, arrive %s%f/+%f' % (pos, oid, len(self.courier_timers), approx_flag, arrival_time_approx, courier_arrival_delay))
-        self.start_courier_timer(ct, arrival_time_approx, orig_order_event)
-
-    def prepare_courier_timer(self, oid, courier_arrival_delay, arrival_time_approx, orig_order_event):
-        if cfg['concurrency'] == 'temporal':
-            timer = Timer(courier_arrival_delay, courier_arrives, (arrival_time_approx,self.q,orig_order_event))
-            timer.setName('CT') # technically there will be 1+ distinct threads, each with name CT, but keeps log simpler
-            return timer
-        else: # priority
-            return 'courier_timer|%s' % oid
+        approx_flag = is_realtime() and '~' or ''
+        self.log(INFO, 'dispatching courier: order %i, %s, new ctimers %i, arrive %s%f/+%f', rec.pos, oid, len(self.courier_timers), approx_flag, arrival_time_approx, courier_arrival_delay)
+        self.start_courier_timer(ct, courier_arrival_delay, arrival_time_approx, rec)
 
-    def start_courier_timer(self, courier_timer, arrival_time_approx, orig_order_event):
+    def start_courier_timer(self, courier_timer, courier_arrival_delay, arrival_time_approx, rec):
+        if self.replaying:
+            return # the trace has the courier's arrival event, at the time it was handled
         if cfg['concurrency'] == 'temporal':
-            courier_timer.start()
+            self.scheduler.schedule(courier_arrival_delay, (arrival_time_approx,self.q,rec,courier_timer))
+        elif cfg['concurrency'] == 'async':
+            asyncio.get_running_loop().call_later(clock.real(courier_arrival_delay), courier_arrives, arrival_time_approx, self.q, rec, courier_timer)
         else: # priority
             p = arrival_time_approx
-            self.q.put((p, ('courier_arrived', courier_timer, orig_order_event)))
+            self.q.put(stamped((p, EV_COURIER_ARRIVED, courier_timer, rec)))
 
     def handle_courier_arrived(self, event):
-        self.log(INFO, 'kitchen handle_courier_arrived: %s' % str(event))
-        now = self.time()
+        self.log(INFO, 'kitchen handle_courier_arrived: %s', event)
+        now = self.now # ditto
 
-        courier_timer    = event[1][1]
-        orig_order_event = event[1][2]
-        order_pos        = orig_order_event[1]
-        order            = orig_order_event[2]
+        courier_timer = event[2]
+        rec           = event[3]
 
         self.courier_timers.remove(courier_timer)
-        self.log(DEBUG, 'courier_timers size down to %i' % len(self.courier_timers))
+        self.log(DEBUG, 'courier_timers size down to %i', len(self.courier_timers))
 
-        oid                  = order['id']
-        loc                  = self.order_locs[oid]
-        order_age            = now - self.order_ready[oid]
-        shelf_life           = order['shelfLife']
-        decay_rate           = order['decayRate']
-        shelf_decay_modifier = self.get_shelf_decay_modifier(loc)
-        ovalue               = order_value(order_age, shelf_life, decay_rate, shelf_decay_modifier)
+        loc       = rec.loc
+        order_age = now - rec.ready
+        ovalue    = order_value(order_age, rec.shelf_life, rec.decay_rate, SHELF_DECAY_MODIFIERS[loc])
 
-        self.courier_arrivals[oid] = now
+        rec.arrival = now
 
-        if loc == 'capdrop':
+        if loc == CAPDROP:
             self.counts['pickupfail_capdrop'] += 1
-            self.log(INFO, "courier cannot pickup because order capdropped: order %i, %s" % (order_pos, order))
-        elif loc == 'wasted':
+            self.log(INFO, "courier cannot pickup because order capdropped: order %i, %s", rec.pos, rec)
+        elif loc == WASTED:
             self.counts['pickupfail_wasted_prior'] += 1
-            self.log(INFO, 'courier wont pickup/deliver, order wasted prior: order %i, %s, now %f, age %f, value %f' % (order_pos, order, now, order_age, ovalue))
-        elif loc in self.shelves:
-            shelf = self.shelves[loc]
-            shelf.remove(order)
+            self.log(INFO, 'courier wont pickup/deliver, order wasted prior: order %i, %s, now %f, age %f, value %f', rec.pos, rec, now, order_age, ovalue)
+        elif loc <= OVERFLOW: # on a shelf
+            self.shelf_list[loc].remove(rec)
             if ovalue <= 0:
-                self.wasted.append(order)
-                self.order_locs[oid] = 'wasted'
+                self.keep(self.wasted, rec)
+                rec.loc = WASTED
                 self.counts['pickupfail_wasted_now'] += 1
-                self.log(INFO, 'courier wont pickup/deliver, order too old, now wasted: order %i, %s, now %f, age %f, value %f' % (order_pos, order, now, order_age, ovalue))
+                self.log(INFO, 'courier wont pickup/deliver, order too old, now wasted: order %i, %s, now %f, age %f, value %f', rec.pos, rec, now, order_age, ovalue)
             else:
+                rec.loc = DELIVERED
+                self.keep(self.delivered, rec)
                 self.counts['orders_delivered'] += 1
-                self.log(INFO, 'courier picks up, instantly delivers: order %i, %s, now %f, age %f, value %f' % (order_pos, order, now, order_age, ovalue)) 
+                self.log(INFO, 'courier picks up, instantly delivers: order %i, %s, now %f, age %f, value %f', rec.pos, rec, now, order_age, ovalue)
         else:
             self.counts['pickupfail_badloc'] += 1
-            self.log(ERROR, 'courier cannot pickup because badloc: %s, %s' % (loc, order))
+            self.log(ERROR, 'courier cannot pickup because badloc: %s, %s', LOC_NAMES[loc], rec)
+
+        if cfg['retention'] != 'full': # its courier has come and gone, so nothing more can happen to the order
+            del self.records[rec.pos]
 
     def check_orders_to_waste(self, now):
         self.log(DEBUG, 'check_orders_to_waste')
         # check if any orders on shelf are so old they should be considered undeliverable
-        # if so, move them from their shelf to waste
-        for t in self.shelf_names:
-            shelf = self.shelves[t]
-            for o in shelf:
-                age = now - self.order_ready[o['id']]
-                self.log(INFO, 'waste check: %s, age %f, value %f' % (o, age, self.order_value(o,now)))
-            to_waste = [o for o in shelf if self.order_value(o,now) <= 0]
-            for o in to_waste:
-                oid = o['id']
-                ready = self.order_ready[oid]
-                ov = self.order_value(o,now)
-                shelf.remove(o)
-                self.wasted.append(o)
-                self.order_locs[oid] = 'wasted'
-                self.counts['ordercheck_wasted'] += 1
-                self.log(INFO, "shelved order old, should be waste: %s, shelf %s, now %f/+%f, ready %f/+%f, age %f, value %f" %
-                    (o, t, now, now-self.started, ready, ready-self.started, now-ready, ov))
-
-    def add_order_to_shelf(self, order, shelfname):
-        self.shelves[shelfname].append(order)
-        self.order_locs[order['id']] = shelfname
-        self.update_peak(shelfname)
-
-    def is_shelf_full(self, name):
-        return not self.is_shelf_avail(name)
-
-    def is_shelf_avail(self, name):
-        return len(self.shelves[name]) < cfg['shelf_capacity'][name]
-
-    def update_peak(self, shelf_name):
-        if len(self.shelves[shelf_name]) > self.peaks[shelf_name]:
-            self.peaks[shelf_name] = len(self.shelves[shelf_name])
+        # if so, move them from their shelf to waste.
+        # every shelved order has an entry in the expiries heap, keyed by when its value reaches 0. so only the
+        # orders which are actually due get looked at, not every shelved order.
+        # unless shelf_arrays (and numpy), when instead every shelf is valued whole, and filtered for waste, each in one call
+        if cfg['log_shelves'] and log_enabled(INFO):
+            for shelf in self.shelf_list:
+                for o, ov in shelf.valued(now):
+                    self.log(INFO, 'waste check: %s, age %f, value %f', o, now - o.ready, ov)
+        if self.shelf_arrays:
+            for t in SHELF_CODES:
+                for o in self.shelf_list[t].expired(now):
+                    self.waste_order(o, t, now, self.order_value(o,now))
+            return
+        expiries = self.expiries
+        due      = now + abs(now) * EXPIRY_SLACK
+        not_yet  = []
+        while expiries and expiries[0][0] <= due:
+            entry = heappop(expiries)
+            deadline, seq, o = entry
+            if o.loc > OVERFLOW or o.deadline != deadline:
+                continue # stale. order left its shelf (picked up, dropped, wasted) or moved to another since
+            ov = self.order_value(o,now)
+            if ov > 0: # only due by rounding. the exact value has the last word, as it always did
+                not_yet.append(entry)
+                continue
+            self.waste_order(o, o.loc, now, ov)
+        for entry in not_yet:
+            heappush(expiries, entry)
+        if len(expiries) > 2 * sum(len(s) for s in self.shelf_list) + 64:
+            self.compact_expiries()
+
+    def waste_order(self, o, t, now, ov):
+        ready = o.ready
+        self.shelf_list[t].remove(o)
+        self.keep(self.wasted, o)
+        o.loc = WASTED
+        self.counts['ordercheck_wasted'] += 1
+        self.log(INFO, "shelved order old, should be waste: %s, shelf %s, now %f/+%f, ready %f/+%f, age %f, value %f",
+            o, LOC_NAMES[t], now, now-self.started, ready, ready-self.started, now-ready, ov)
+
+    def compact_expiries(self):
+        # drops the stale entries, which otherwise pile up as orders leave or move between shelves
+        self.expiries = [e for e in self.expiries if e[2].loc <= OVERFLOW and e[2].deadline == e[0]]
+        heapify(self.expiries)
+
+    def add_order_to_shelf(self, rec, loc):
+        self.shelf_list[loc].append(rec)
+        rec.loc = loc
+        self.update_peak(loc)
+        rec.deadline = order_deadline(rec.ready, rec.shelf_life, rec.decay_rate, SHELF_DECAY_MODIFIERS[loc])
+        if rec.deadline != float('inf') and not self.shelf_arrays: # whole shelves are valued instead
+            heappush(self.expiries, (rec.deadline, self.expiry_seq, rec))
+            self.expiry_seq += 1
+
+    def is_shelf_full(self, loc):
+        return not self.is_shelf_avail(loc)
+
+    def is_shelf_avail(self, loc):
+        return len(self.shelf_list[loc]) < self.capacity[loc]
+
+    def update_peak(self, loc):
+        name = LOC_NAMES[loc]
+        if len(self.shelf_list[loc]) > self.peaks[name]:
+            self.peaks[name] = len(self.shelf_list[loc])
 
     def get_shelf_decay_modifier(self, loc):
-        return (loc in SINGLE_TEMPS) and 1.0 or 2.0
+        return SHELF_DECAY_MODIFIERS[loc]
 
-    def order_value(self, order, now):
-        oid                  = order['id']
-        order_age            = now - self.order_ready[oid]
-        shelf_life           = order['shelfLife']
-        decay_rate           = order['decayRate']
-        loc                  = self.order_locs[oid]
-        shelf_decay_modifier = self.get_shelf_decay_modifier(loc)
-        return order_value(order_age, shelf_life, decay_rate, shelf_decay_modifier)
+    def order_value(self, rec, now):
+        return order_value(now - rec.ready, rec.shelf_life, rec.decay_rate, SHELF_DECAY_MODIFIERS[rec.loc])
 
     def time(self):
-        return cfg['concurrency'] == 'temporal' and time() or self.now
+        return is_realtime() and clock.time() or self.now
+
+    def status_due(self):
+        # whether the STATUS line should be logged for the event just counted. sampled by event count and/or sim time
+        every_events  = cfg['status_every_events']
+        every_simtime = cfg['status_every_simtime']
+        if every_events and self.counts['events'] % every_events == 0:
+            return True
+        if every_simtime and self.now - self.status_at >= every_simtime:
+            self.status_at = self.now
+            return True
+        return False
 
     def status(self):
+        if not log_enabled(INFO): return
         now = self.time()
         #timerel = self.started and (now - self.started) or 0.0
-        self.log(INFO, 'STATUS otlife %i-%i-%i, ktlife %i-%i-%i-%i, kqueue %i, ctasks %i, hot %i/%i/%s, cold %i/%i/%s, frozen %i/%i/%s, overflow %i/%i/%s, noshelf %i, capdrops %i, wasted %i, ocheckw %i, events %i, unhand %i, orders %i, oready %i, cdispatch %i, carrive %i, pfailcd %i, pfailwap %i, pfailwan %i, pfailbl %i, deliver %i' %
-            ((ot.started is not None) and 1 or 0,     # was OT ever started? 1 if yes. 0 if no
+        self.log(INFO, 'STATUS otlife %i-%i-%i, ktlife %i-%i-%i-%i, kqueue %i, ctasks %i, hot %i/%i/%s, cold %i/%i/%s, frozen %i/%i/%s, overflow %i/%i/%s, noshelf %i, capdrops %i, wasted %i, ocheckw %i, events %i, unhand %i, orders %i, oready %i, cdispatch %i, carrive %i, pfailcd %i, pfailwap %i, pfailwan %i, pfailbl %i, deliver %i',
+            (ot.started is not None) and 1 or 0,     # was OT ever started? 1 if yes. 0 if no
              ot.is_alive() and 1 or 0,                # is OT running now?   (ditto above)
              (ot.exception is not None) and 1 or 0,   # did OT stop due to an exception?
              (self.started is not None) and 1 or 0,   # was KT ever started?
              self.is_alive() and 1 or 0,              # is KT running now?
              (self.exception is not None) and 1 or 0, # did KT stop due to an exception?
-             self.counts['event:shutdown'],           # did KT receive a shutdown event? how many?
+             self.event_counts[EV_SHUTDOWN],          # did KT receive a shutdown event? how many?
              self.q.qsize(),
              len(self.courier_timers),
              len(self.shelves['hot']),
@@ -394,140 +1446,562 @@ class KitchenThread(Thread):
              self.peaks['overflow'],
              cfg['shelf_capacity']['overflow'],
              self.counts['noshelf'],
-             len(self.capacity_dropped),
-             len(self.wasted),
+             self.counts['capdrops'],
+             self.counts['ordercheck_wasted'] + self.counts['pickupfail_wasted_now'],
              self.counts['ordercheck_wasted'],
              self.counts['events'],
              self.counts['unhand'],
-             self.counts['event:order_received'],
-             len(self.order_ready),
+             self.event_counts[EV_ORDER_RECEIVED],
+             len(self.records),
              self.counts['couriers_dispatched'],
-             self.counts['event:courier_arrived'],
+             self.event_counts[EV_COURIER_ARRIVED],
              self.counts['pickupfail_capdrop'],
              self.counts['pickupfail_wasted_prior'],
              self.counts['pickupfail_wasted_now'],
              self.counts['pickupfail_badloc'],
-             self.counts['orders_delivered']))
-        self.log_shelves(now)
+             self.counts['orders_delivered'])
+        if cfg['log_shelves']: self.log_shelves(now)
 
     def log_shelves(self, now):
         for k in self.shelf_names:
             if not len(self.shelves[k]): continue
-            os = ("%s %f" % (o['id'],self.order_value(o,now)) for o in self.shelves[k])
+            os = ("%s %f" % (o.id,ov) for o, ov in self.shelves[k].valued(now))
             s = ', '.join(os)
-            self.log(INFO, "shelf %-8s: %s" % (k,s))
+            self.log(INFO, "shelf %-8s: %s", k,s)
 
     def log(self, level, message, *args, **kwargs):
+        if not log_enabled(level): return
         now = self.time()
         timerel = self.started and (now - self.started) or 0 # real time only in temporal mode; in priority mode its a simulated time diff
-        log(level, "+%5.6f:  %s" % (timerel,message), *args, **kwargs)
+        log(level, "+%5.6f:  " + message, timerel, *args, **kwargs)
 
 
 def log(level, message, *args, **kwargs):
+    # args are formatted into message by logging itself, and only if level is enabled. so callers should pass them,
+    # not pre-format with %, and guard with log_enabled() any work done only to produce a log line
     #print(message, *args, **kwargs)
     logging.log(level, message, *args, **kwargs)
 
+def log_enabled(level):
+    return logging.root.isEnabledFor(level)
+
+def is_realtime():
+    # whether the sim runs in real (wall clock) time, rather than simulated time
+    return cfg['concurrency'] in ('temporal', 'async')
+
 def log_mt(level, message, *args, **kwargs):
-    log(level, "            :  %s" % message)
+    log(level, "            :  " + message, *args, **kwargs)
 
-def courier_arrives(arrival_time_approx, kitchenQ, orig_order_event):
-    # only used in temporal concurrency mode. only called by a KT-started courier Timer
+def courier_arrives(arrival_time_approx, kitchenQ, rec, courier_timer):
+    # only used in the real time concurrency modes. called by KT's CourierScheduler on its thread, if temporal, or by
+    # the event loop on MT, if async
     #TODO consider making method of KT
-    courier_timer = current_thread()
-    now = time()
+    now = clock.time()
     time_span = now - kt.started #TODO this is not ideal way but close enough
-    log(INFO, '+%5.6f:  courier_arrives: thread %s, order %i, %s' % (time_span, courier_timer, orig_order_event[1], orig_order_event[2]['id']))
-    kitchenQ.put((TEMPORAL_P,('courier_arrived', courier_timer, orig_order_event)))
+    log(INFO, '+%5.6f:  courier_arrives: order %i, %s', time_span, rec.pos, rec.id)
+    kitchenQ.put(stamped((TEMPORAL_P, EV_COURIER_ARRIVED, courier_timer, rec)))
+
+def stamped(event):
+    # the event, plus when it was put, if cfg.latency_stats. so KT can tell how long it waited in the queue
+    return cfg['latency_stats'] and event + (perf_counter(),) or event
+
+def usecs(secs):
+    return '%.1fus' % (secs * 1e6)
 
 def order_value(order_age, shelf_life, decay_rate, shelf_decay_modifier):
     decay              = order_age * decay_rate * shelf_decay_modifier
     shelf_life_decayed = float(shelf_life) - decay
     return shelf_life_decayed / shelf_life
 
+def iter_orders(path):
+    # streams orders from a file. either a JSON array of orders, or NDJSON (one order per line, optionally
+    # preceded by a header line like {"total": 132}). the format is sniffed from the first non-blank char.
+    # or the columnar binary format, known by its magic bytes
+    if is_columnar_orders(path):
+        with ColumnarOrders(path) as orders:
+            yield from orders
+        return
+    with open(path) as f:
+        if sniff_orders_format(f) == 'array':
+            yield from iter_json_array(f)
+        else:
+            for line in f:
+                record = parse_ndjson_line(line)
+                if record is not None and not is_orders_header(record):
+                    yield record
+
+def is_columnar_orders(path):
+    with open(path, 'rb') as f:
+        return f.read(len(COLUMNAR_MAGIC)) == COLUMNAR_MAGIC
+
+def write_columnar_orders(orders, path):
+    # writes orders (any iterable of them) as a columnar orders file, streaming: each column goes to its own temp file
+    # til the count is known, so only the string table is held in memory. returns the count. orders with fields other
+    # than the format's, or ids which aren't UUIDs in their canonical form, are refused, so the file reads back the same
+    strings, indexes = [], {}
+    def index_of(s):
+        if s not in indexes:
+            indexes[s] = len(strings)
+            strings.append(s)
+        return indexes[s]
+    temps = [TemporaryFile() for c in COLUMNAR_COLUMNS]
+    count = 0
+    try:
+        for order in orders:
+            extra = set(order).difference(COLUMNAR_COLUMNS)
+            if extra:
+                raise ValueError('order %i has fields the columnar format lacks: %s' % (count + 1, sorted(extra)))
+            oid = str(order['id'])
+            uuid = UUID(oid)
+            if str(uuid) != oid:
+                raise ValueError('order %i id is not a canonical UUID: %s' % (count + 1, oid))
+            if order.get('kitchen', 0) < 0:
+                raise ValueError('order %i kitchen is negative, which the columnar format reads back as none' % (count + 1))
+            values = (uuid.bytes, order['shelfLife'], order['decayRate'], index_of(order['name']), index_of(order['temp']),
+                      order.get('kitchen', -1))
+            for f, st, v in zip(temps, COLUMNAR_COLUMNS.values(), values):
+                f.write(st.pack(v))
+            count += 1
+        table = json_dumps(strings).encode()
+        with open(path, 'wb') as out:
+            out.write(COLUMNAR_MAGIC)
+            out.write(COLUMNAR_HEADER.pack(count, len(COLUMNAR_MAGIC) + COLUMNAR_HEADER.size
+                                           + count * sum(st.size for st in COLUMNAR_COLUMNS.values()), len(table)))
+            for f in temps:
+                f.seek(0)
+                while True:
+                    chunk = f.read(ORDERS_CHUNK_SIZE)
+                    if not chunk: break
+                    out.write(chunk)
+            out.write(table)
+    finally:
+        for f in temps:
+            f.close()
+    return count
+
+def order_kitchen(order, kitchens):
+    # which kitchen of the fleet an order goes to: its own kitchen field if it has one, else a hash of its id. crc32,
+    # not hash(), so every process agrees. a negative kitchen is none, as in the columnar format
+    k = order.get('kitchen')
+    if k is not None and int(k) >= 0:
+        return int(k) % kitchens
+    return crc32(str(order['id']).encode()) % kitchens
+
+def kitchen_seed(stream=0):
+    # the seed of one of this run's kitchen's streams: 0 courier delays, 1 order gaps, 2 synthetic orders. kitchen 0's
+    # are the seed plus stream, so a lone kitchen is as it was
+    if cfg['seed'] is None: return None
+    return cfg['seed'] + stream + (cfg['kitchen'] << 32)
+
+def synthetic_orders(count=None, seed=None):
+    # generates orders as they're placed, per the synthetic_* params, so only one is ever held. count None is
+    # unbounded. the same seed gives the same orders
+    mix = cfg['synthetic_temp_mix']
+    for temp in mix:
+        if temp not in SYNTHETIC_NAMES:
+            raise ValueError('unknown synthetic_temp_mix temp: %s' % temp)
+    temps   = [temp for temp in mix if mix[temp] > 0]
+    weights = list(accumulate(mix[temp] for temp in temps))
+    life_lo, life_hi   = cfg['synthetic_shelf_life']
+    decay_lo, decay_hi = cfg['synthetic_decay_rate']
+    ids      = Random(seed)
+    variates = Variates(seed ^ SYNTHETIC_SALT if seed is not None else None) # not the ids' own stream, word for word
+    placed   = 0
+    while count is None or placed < count:
+        temp  = temps[bisect_right(weights, variates.uniform(0, weights[-1]))]
+        names = SYNTHETIC_NAMES[temp]
+        yield {
+            'id'       : str(UUID(int=ids.getrandbits(128), version=4)),
+            'name'     : names[int(variates.uniform(0, len(names)))],
+            'temp'     : temp,
+            'shelfLife': int(variates.uniform(life_lo, life_hi + 1)),
+            'decayRate': variates.uniform(decay_lo, decay_hi)}
+        placed += 1
+
+def read_orders_total(path):
+    # the total promised by an NDJSON header line, if there is one, or by a columnar file's header. otherwise None
+    if is_columnar_orders(path):
+        with ColumnarOrders(path) as orders:
+            return len(orders)
+    with open(path) as f:
+        if sniff_orders_format(f) != 'ndjson': return None
+        for line in f:
+            record = parse_ndjson_line(line)
+            if record is not None:
+                return int(record['total']) if is_orders_header(record) else None
+    return None
+
+def count_orders(path):
+    # counting pass over an orders file. only holds one order in memory at a time
+    count = 0
+    for order in iter_orders(path):
+        count += 1
+    return count
+
+def sniff_orders_format(f):
+    # leaves f positioned at its start
+    while True:
+        chunk = f.read(ORDERS_CHUNK_SIZE)
+        stripped = chunk.lstrip()
+        if stripped or not chunk: break
+    f.seek(0)
+    return stripped.startswith('[') and 'array' or 'ndjson'
+
+def parse_ndjson_line(line):
+    line = line.strip()
+    return json_loads(line) if line else None
+
+def is_orders_header(record):
+    return 'total' in record and 'id' not in record
+
+def iter_json_array(f):
+    # incremental parse of a JSON array, yielding each element as soon as it's complete. holds one chunk at a time
+    decode = JSONDecoder().raw_decode
+    buf, pos, eof = '', 0, False
+
+    def fill(): # drop what's been consumed, append the next chunk
+        nonlocal buf, pos, eof
+        chunk = f.read(ORDERS_CHUNK_SIZE)
+        buf, pos, eof = buf[pos:] + chunk, 0, not chunk
+
+    def skip_ws():
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in ' \t\r\n': pos += 1
+            if pos < len(buf) or eof: break
+            fill()
+        if pos == len(buf):
+            raise ValueError('orders file ended before its JSON array was closed')
+
+    skip_ws()
+    if buf[pos] != '[':
+        raise ValueError('orders file is not a JSON array')
+    pos += 1
+    skip_ws()
+    if buf[pos] == ']': return
+    while True:
+        while True:
+            try:
+                value, end = decode(buf, pos)
+                if end < len(buf) or eof: break # a value that runs to the end of the buffer may continue in the next chunk
+            except JSONDecodeError:
+                if eof: raise
+            fill()
+        pos = end
+        yield value
+        skip_ws()
+        if buf[pos] == ']': return
+        if buf[pos] != ',':
+            raise ValueError('expected , or ] in JSON array of orders, got: %r' % buf[pos])
+        pos += 1
+        skip_ws()
+
+def order_deadline(ready, shelf_life, decay_rate, shelf_decay_modifier):
+    # the time at which order_value(time - ready, ...) reaches 0. since value falls linearly with age. inf if never
+    rate = decay_rate * shelf_decay_modifier
+    return ready + shelf_life / rate if rate > 0 else float('inf')
+
 def configure(*args, **kwargs):
     global cfg
 
     current_thread().setName('MT') # non-ideal but lesser evil for logs; configure intended to be called only by a main thread
 
-    logging.basicConfig(stream=sys.stdout, format='%(levelname)-5s %(threadName)s: %(message)s', level=logging.INFO)
+    logging.basicConfig(stream=sys.stdout, format=LOG_FORMAT, level=logging.INFO)
 
     log_mt(INFO, '; '.join(__doc__.strip().split('\n'))) # banner at log start
 
-    log_mt(INFO, 'sys.argv: %s'         % sys.argv)
-    log_mt(INFO, 'config fn args: %s'   % str(args))
-    log_mt(INFO, 'config fn kwargs: %s' % kwargs)
+    log_mt(INFO, 'sys.argv: %s', sys.argv)
+    log_mt(INFO, 'config fn args: %s',  args)
+    log_mt(INFO, 'config fn kwargs: %s', kwargs)
 
     base_config = './config.py'
-    log_mt(INFO, 'loading base config: %s' % base_config)
+    log_mt(INFO, 'loading base config: %s', base_config)
     with open(base_config) as f:
         cfg = eval(f.read())
 
     config2 = None
 
-    if len(sys.argv) > 1:
-        config2 = sys.argv[1] #TODO non-ideal, but not an actual issue at present
-
-    if len(args) > 0:
+    if len(args) > 0: # only main passes sys.argv along. configure never reads it, so tests & other callers can't trip on it
         config2 = args[0]
 
     if config2:
-        log_mt(INFO, 'config will update from: %s' % config2)
+        log_mt(INFO, 'config will update from: %s', config2)
         #TODO if not found try again looking in configs/*
         with open(config2) as f:
             cfg2 = eval(f.read())
             cfg.update(cfg2)
 
-    if 'concurrency' in kwargs: #TODO add support for every other config param
-        log_mt(INFO, 'config will update from kwargs: concurrency = %s' % kwargs['concurrency'])
-        cfg['concurrency'] = kwargs['concurrency']
+    for k, v in kwargs.items(): # overrides any config param, last
+        if k not in cfg:
+            raise KeyError('unknown config param: %s' % k)
+        log_mt(INFO, 'config will update from kwargs: %s = %s', k, v)
+        cfg[k] = v
 
 def log_cfg():
     cfg2log = cfg
-    if not cfg['log_config_large_orders_literal'] and cfg['orders_literal'] and len(cfg['orders_literal']) > 10:
+    if not cfg['log_config_large_orders_literal'] and hasattr(cfg['orders_literal'], '__len__') and len(cfg['orders_literal']) > 10:
         cfg2log = dict(cfg)
         ol_len = len(cfg2log['orders_literal'])
         cfg2log['orders_literal'] = '[...orders not shown due to log_config_large_orders_literal off (array size %i)...]' % ol_len
     
-    log_mt(INFO, 'cfg: %s' % cfg2log)
-
-def run():
-    global ot, kt, simu_time_span
-
+    log_mt(INFO, 'cfg: %s', cfg2log)
+
+def run_des():
+    # single-threaded discrete-event engine. neither OT nor KT is started as a thread. MT pulls orders from OT one at a
+    # time, and before each next order is placed, has KT handle every event scheduled earlier than it. so the heap only
+    # ever holds the orders and couriers in flight, not the whole input. events tied on time are handled as in priority
+    # mode, by event code (a courier before an order), then in the order they were queued
+    resumed = ot.started is not None # from a checkpoint, which restored both
+    if not resumed:
+        ot.started = ot.now
+        kt.started = kt.now
+    every_events  = cfg['checkpoint_file'] and cfg['checkpoint_every_events']
+    every_simtime = cfg['checkpoint_file'] and cfg['checkpoint_every_simtime']
+    checkpointed  = (kt.counts['events'], kt.now) # as of the last checkpoint, or the start
+    try:
+        ot.log(INFO, resumed and 'resumed' or 'started')
+        kt.log(INFO, resumed and 'resumed' or 'started')
+        for pause_between_orders in ot.place_orders():
+            ot.now += pause_between_orders
+            kt.run_until(ot.now)
+            if (every_events and kt.counts['events'] - checkpointed[0] >= every_events) \
+                    or (every_simtime and kt.now - checkpointed[1] >= every_simtime):
+                save_checkpoint(cfg['checkpoint_file'])
+                checkpointed = (kt.counts['events'], kt.now)
+        ot.log(INFO, 'exits')
+        kt.q.put(stamped((SHUTDOWN_P, EV_SHUTDOWN, 0, None)))
+        kt.drain()
+        kt.log(INFO, 'exits')
+    except BaseException as ex:
+        kt.exception = ex # one thread of control, so charge it to the kitchen, which owns the run loop
+        logging.exception(ex) #TODO 1-line. app log format
+        raise
+
+def check_checkpointable():
+    # checkpoints are des only, where MT alone owns all the state, between events. and the orders must be readable again
+    # from the start, the same ones in the same order, since a resume skips those already placed
+    if cfg['concurrency'] != 'des':
+        raise ValueError('checkpoint_file needs des concurrency, not %s' % cfg['concurrency'])
+    if cfg['orders_literal'] is not None and not isinstance(cfg['orders_literal'], (list, tuple)):
+        raise ValueError('checkpoint_file needs orders_literal to be a list, not an iterator')
+    if cfg['orders_literal'] is None and cfg['orders_source'] == 'synthetic' and cfg['seed'] is None:
+        raise ValueError('checkpoint_file needs a seed for synthetic orders, so a resume gets the same ones')
+
+def save_checkpoint(path):
+    # everything a des run needs to carry on from here: the config, OT's place in the orders and arrival stream, and all
+    # of KT's state, pending events and random streams included. one pickle, so the records shared between shelves,
+    # heaps and events stay shared. written to a temp file then renamed over, so a crash mid-write keeps the last one
+    state = {
+        'version': CHECKPOINT_VERSION,
+        'cfg'    : cfg,
+        'ot'     : {a: getattr(ot, a) for a in CHECKPOINT_OT_ATTRS},
+        'kt'     : {a: getattr(kt, a) for a in CHECKPOINT_KT_ATTRS}}
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+    log_mt(INFO, 'checkpoint saved: %s, orders placed %i, events %i, now +%f', path, ot.placed, kt.counts['events'], kt.now - kt.started)
+
+def load_checkpoint(path):
+    with open(path, 'rb') as f:
+        state = pickle.load(f)
+    if state.get('version') != CHECKPOINT_VERSION:
+        raise ValueError('checkpoint version %s, expected %i: %s' % (state.get('version'), CHECKPOINT_VERSION, path))
+    return state
+
+def resume(path, **kwargs):
+    # continues a des run from its checkpoint file, as if it had never stopped. the config is the one saved with it,
+    # except as overridden by kwargs (eg. log_level)
+    global cfg
+    configure() # for its logging setup. its config is then replaced by the checkpoint's
+    log_mt(INFO, 'resuming from checkpoint: %s', path)
+    state = load_checkpoint(path)
+    cfg = state['cfg']
+    for k, v in kwargs.items():
+        if k not in cfg:
+            raise KeyError('unknown config param: %s' % k)
+        log_mt(INFO, 'config will update from kwargs: %s = %s', k, v)
+        cfg[k] = v
+    run(state)
+
+def read_trace(path):
+    # the kitchen's start time, and an iterator over the trace's records: (event code, sim time, order pos, delay)
+    f = open(path, 'rb')
+    if f.read(len(TRACE_MAGIC)) != TRACE_MAGIC:
+        f.close()
+        raise ValueError('not a trace file: %s' % path)
+    started, = TRACE_HEADER.unpack(f.read(TRACE_HEADER.size))
+    def records():
+        with f:
+            while True:
+                chunk = f.read(TRACE_RECORD.size * TRACE_CHUNK_RECORDS)
+                if len(chunk) % TRACE_RECORD.size:
+                    raise ValueError('trace file truncated mid-record: %s' % path)
+                if not chunk: return
+                yield from TRACE_RECORD.iter_unpack(chunk)
+    return started, records()
+
+def replay(path, *args, **kwargs):
+    # re-runs a traced run by feeding its events straight into KT's handlers, in the order and at the sim times they
+    # were handled. the config is given the same way as to main (eg. a changed eviction policy) but its orders must be
+    # the traced run's, since the trace only has their positions
+    configure(*args, **kwargs)
+    log_mt(INFO, 'replaying trace: %s', path)
+    cfg['concurrency'] = 'des' # on MT, no threads
+    cfg['trace_file']  = None  # never overwrite the trace being read
+    run(replay=path)
+
+def run_replay(path):
+    started, records = read_trace(path)
+    ot.started = ot.now = kt.started = kt.now = started
+    kt.replaying = True
+    kt.log(INFO, 'replaying')
+    orders   = ot.read_orders()
+    placed   = 0
+    inflight = {} # pos -> record of each order whose courier has yet to arrive
+    for code, t, pos, delay in records:
+        if code == EV_ORDER_RECEIVED:
+            if pos <= placed:
+                raise ValueError('trace orders out of sequence: order %i after %i' % (pos, placed))
+            for order in islice(orders, pos - placed - 1, None): # skips any the traced run never placed
+                break
+            else:
+                raise ValueError('trace has order %i, more than the orders configured' % pos)
+            placed = pos
+            kt.courier_delay = delay
+            kt.handle_event((t, EV_ORDER_RECEIVED, pos, order))
+            inflight[pos] = kt.records[pos]
+        elif code == EV_COURIER_ARRIVED:
+            rec = inflight.pop(pos, None)
+            if rec is None:
+                raise ValueError('trace has a courier for order %i, which it never placed or already picked up' % pos)
+            kt.handle_event((t, EV_COURIER_ARRIVED, pos, rec))
+        else:
+            kt.handle_event((SHUTDOWN_P, EV_SHUTDOWN, 0, None))
+    kt.log(INFO, 'exits')
+
+def run_async():
+    # the real time modes' producer/consumer, but as 2 coroutines on one asyncio event loop, on MT, rather than threads.
+    # couriers are loop.call_later callbacks, rather than entries in a scheduler thread's heap
+    async def both():
+        kt_task = asyncio.ensure_future(kt.run_async())
+        await ot.run_async() # til all orders submitted, or OT dies
+        kt.q.put(stamped((TEMPORAL_P, EV_SHUTDOWN, 0, None)))
+        await kt_task # til all events/tasks done, or KT dies
+    asyncio.run(both())
+
+def run(checkpoint=None, replay=None):
+    # checkpoint is the state loaded from a checkpoint file, to resume from. see resume(). replay is a trace file path.
+    # if cfg.log_file, the whole run logs to it, via a BatchingLogHandler, in place of the usual handlers
+    global log_sink
+    if cfg['log_file'] is None:
+        return run_logged(checkpoint, replay)
+    log_sink = BatchingLogHandler(cfg['log_file'], cfg['log_queue_size'])
+    handlers = logging.root.handlers
+    logging.root.handlers = [log_sink]
+    try:
+        run_logged(checkpoint, replay)
+    finally:
+        logging.root.handlers = handlers
+        log_sink.close()
+        log_mt(log_sink.dropped and WARNING or INFO, 'log sink wrote %i lines to %s, dropped %i', log_sink.written, log_sink.path, log_sink.dropped)
+
+def run_logged(checkpoint, replay):
+    global ot, kt, simu_time_span, real_time_span, clock
+
+    clock   = Clock(cfg['time_scale'])
     started = time()
 
+    if cfg['log_level'] is not None: # applied here, not in configure, so a test or caller can still override it in cfg
+        logging.root.setLevel(cfg['log_level'])
+
     log_cfg()
 
+    if cfg['checkpoint_file'] or checkpoint is not None:
+        check_checkpointable()
+
     kt = KitchenThread(started) # has the only event queue. only consumer. some producing
     ot = OrderingThread(kt.q,started) # producer-only
 
+    if checkpoint is not None:
+        for a, v in checkpoint['ot'].items(): setattr(ot, a, v)
+        for a, v in checkpoint['kt'].items(): setattr(kt, a, v)
+        ot.kitchenQ = kt.q
+        kt.q.heap   = [(p, code, seq, event[:4]) for p, code, seq, event in kt.q.heap] # unstamped. their stamps were of another process's clock
+
     kt.status()
 
-    if cfg['concurrency'] == 'temporal':
-        kt.start()
-        ot.start()
-        ot.join() # wait til all orders submitted, or OT dies
-        priority = TEMPORAL_P # priority field ignored in temporal mode. prefer consistency
-    else: # priority
-        ot.start()
-        ot.join() # wait til all orders submitted, or OT dies
-        kt.start()
-        priority = SHUTDOWN_P
+    if replay is not None:
+        run_replay(replay) # ditto, but the events are the trace's
+    elif cfg['concurrency'] == 'des':
+        run_des() # returns once every event, shutdown included, has been handled
+    elif cfg['concurrency'] == 'async':
+        run_async() # ditto
+    else:
+        if cfg['concurrency'] == 'temporal':
+            kt.scheduler.start()
+            kt.start()
+            ot.start()
+            ot.join() # wait til all orders submitted, or OT dies
+            priority = TEMPORAL_P # priority field ignored in temporal mode. prefer consistency
+        else: # priority
+            ot.start()
+            ot.join() # wait til all orders submitted, or OT dies
+            kt.start()
+            priority = SHUTDOWN_P
+
+        kt.q.put(stamped((priority, EV_SHUTDOWN, 0, None)))
+
+        kt.join() # wait til all events/tasks done, or KT dies
+
+        if kt.scheduler is not None: # every courier has arrived by now, unless KT died
+            kt.scheduler.stop()
+            kt.scheduler.join()
 
-    kt.q.put((priority,('shutdown',)))
+    if kt.trace is not None:
+        kt.trace.close()
+    if kt.series is not None:
+        if kt.started is not None:
+            kt.sample_metrics(final=True)
+        kt.series.close()
 
-    kt.join() # wait til all events/tasks done, or KT dies
+    if kt.latency is not None:
+        kt.log_latency()
 
     kt.status() # note that we only call KT's status method from MT when we know KT and OT are not running
 
     ended                              = time()
     real_time_span                     = ended - started
     simu_time_span                     = kt.now - kt.started
-    log_mt(INFO, 'simu time span: %fs' % simu_time_span)
-    log_mt(INFO, 'real time span: %fs' % real_time_span)
+    log_mt(INFO, 'simu time span: %fs', simu_time_span)
+    log_mt(INFO, 'real time span: %fs', real_time_span)
+    if is_realtime() and clock.scale != 1.0:
+        log_mt(INFO, 'time scale: %gx', clock.scale)
+
+def summary():
+    # the headline outcome counters of the last run, as a flat dict. eg. one row of a sweep's table
+    return {
+        'concurrency'   : cfg['concurrency'],
+        'orders'        : kt.event_counts[EV_ORDER_RECEIVED],
+        'delivered'     : kt.counts['orders_delivered'],
+        'wasted'        : kt.counts['ordercheck_wasted'] + kt.counts['pickupfail_wasted_now'],
+        'capdrops'      : kt.counts['capdrops'],
+        'noshelf'       : kt.counts['noshelf'],
+        'peak_hot'      : kt.peaks['hot'],
+        'peak_cold'     : kt.peaks['cold'],
+        'peak_frozen'   : kt.peaks['frozen'],
+        'peak_overflow' : kt.peaks['overflow'],
+        'simu_span'     : simu_time_span,
+        'real_span'     : real_time_span}
 
 def main(*args, **kwargs):
     configure(*args,**kwargs)
     run()
 
 if __name__ == '__main__':
-    main()
+    if sys.argv[1:2] == ['--resume']:
+        resume(sys.argv[2])
+    elif sys.argv[1:2] == ['--replay']:
+        replay(sys.argv[2], *sys.argv[3:4])
+    else:
+        main(*sys.argv[1:2])
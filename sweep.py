@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+'''
+sweep: runs many sim config permutations in parallel, over a process pool, and tabulates each run's summary
+'''
+
+import argparse
+from itertools import product
+import json
+import logging
+from multiprocessing import Pool
+import os
+import sys
+
+import sim
+
+COLUMNS = ('config', 'overrides', 'concurrency', 'orders', 'delivered', 'wasted', 'capdrops', 'noshelf',
+           'peak_hot', 'peak_cold', 'peak_frozen', 'peak_overflow', 'simu_span', 'real_span', 'error')
+
+orders_cache = {} # per worker process. orders_file path -> its parsed orders, so each file is parsed once per worker
+
+
+def config_paths(paths):
+    # config files, in the order given. a dir stands for every config-*.py file in it
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            found.extend(sorted(os.path.join(path, fn) for fn in os.listdir(path) if fn.startswith('config-') and fn.endswith('.py')))
+        else:
+            found.append(path)
+    return found
+
+def grid_overrides(grid):
+    # every combination of the grid's values, as a list of override dicts. grid is {param: [value, ...], ...}
+    if not grid: return [{}]
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in product(*(grid[k] for k in keys))]
+
+def jobs(paths, grid):
+    return [(path, overrides) for path in (config_paths(paths) or [None]) for overrides in grid_overrides(grid)]
+
+def init_worker(log_level):
+    logging.basicConfig(stream=sys.stdout, format='%(levelname)-5s %(threadName)s: %(message)s', level=log_level)
+
+def run_job(job):
+    # one sim run, in a pool worker. returns its summary row, or the error which stopped it
+    path, overrides = job
+    row = {'config': path or '-', 'overrides': overrides}
+    try:
+        sim.configure(*(path and (path,) or ()), **overrides)
+        use_cached_orders()
+        sim.run()
+        row.update(sim.summary())
+    except Exception as ex:
+        row['error'] = repr(ex)
+    return row
+
+def use_cached_orders():
+    # swaps the configured orders file for the worker's cached parse of it, parsing it on first use. unless columnar
+    if sim.cfg['orders_literal'] is not None: return
+    fn = sim.cfg['orders_file']
+    if sim.cfg['orders_source'] != 'file' or sim.is_columnar_orders(fn): # generated, or mapped and so already shared
+        return
+    if fn not in orders_cache:
+        orders_cache[fn] = list(sim.iter_orders(fn))
+    sim.cfg['orders_literal'] = orders_cache[fn]
+    sim.cfg['log_config_large_orders_literal'] = False
+
+def sweep(paths=(), grid=None, workers=None, log_level='WARNING'):
+    # returns the summary rows, in job order
+    overrides = {'log_level': log_level}
+    js = [(path, dict(overrides, **o)) for path, o in jobs(paths, grid)]
+    with Pool(workers, initializer=init_worker, initargs=(log_level,)) as pool:
+        return pool.map(run_job, js, chunksize=1)
+
+def format_cell(v):
+    if v is None: return ''
+    if isinstance(v, float): return '%.3f' % v
+    if isinstance(v, dict): return ','.join('%s=%s' % (k, v[k]) for k in v if k != 'log_level')
+    return str(v)
+
+def print_table(rows, f=sys.stdout, columns=COLUMNS):
+    cells  = [columns] + [tuple(format_cell(row.get(c)) for c in columns) for row in rows]
+    widths = [max(len(r[i]) for r in cells) for i in range(len(columns))]
+    for r in cells:
+        f.write('  '.join(c.ljust(w) for c, w in zip(r, widths)).rstrip() + '\n')
+
+def print_csv(rows, f=sys.stdout, columns=COLUMNS):
+    import csv
+    w = csv.writer(f)
+    w.writerow(columns)
+    for row in rows:
+        w.writerow([format_cell(row.get(c)) for c in columns])
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='runs sim config permutations in parallel and tabulates their summaries')
+    ap.add_argument('configs', nargs='*', help='config files, or dirs of them (eg. configs/). none for just config.py')
+    ap.add_argument('--grid', help="dict literal of param -> list of values, eg. \"{'order_rate': [2, 10]}\". every combination runs, per config")
+    ap.add_argument('--workers', type=int, help='processes in the pool. default one per core')
+    ap.add_argument('--log-level', default='WARNING', help='of each run. default WARNING')
+    ap.add_argument('--format', choices=('table', 'csv', 'json'), default='table')
+    args = ap.parse_args(argv)
+
+    grid = eval(args.grid) if args.grid else None # same as the config files, a Python literal, so float('inf') works
+    rows = sweep(args.configs, grid, args.workers, args.log_level)
+
+    if args.format == 'json':
+        json.dump(rows, sys.stdout, indent=1, default=str)
+        sys.stdout.write('\n')
+    elif args.format == 'csv':
+        print_csv(rows)
+    else:
+        print_table(rows)
+    return 1 if any(row.get('error') for row in rows) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())